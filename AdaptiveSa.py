@@ -1,11 +1,14 @@
 from OneReinsert import one_reinsert
 import random
 import math
-from Common import copy_solution, load_best, save_to_file
+from Common import copy_solution, load_best, save_to_file, flush_saves, acceptance_bound
 from TruckSectionReinsert import truck_section_reinsert
 from FlattenSection import flatten_section
 from MultipleReinsert import x_destroy_regret_reinsert
 from TruckSectionReinsertRegret import truck_section_reinsert_regret
+from RouteOpt import route_opt
+from Split import split_relocate
+from TimeBudget import TimeBudget, budget_steps, CALIBRATION_SHARE, MIN_CALIBRATION
 
 
 #For this adaptive SA, I have had the problem that it is hard to evaluate the "performance" of operators that are meant to explore.
@@ -17,19 +20,48 @@ from TruckSectionReinsertRegret import truck_section_reinsert_regret
 # As we reach local optima, gradient goes to zero: in which case I want to tend towards uniform weight of operators.
 # SUMMARY:
 # Instead of quantifying exploration, I default to exploration unless we find exploitation to be fruitful.
+#
+# With share (a MultiSeed.SharedBest), this is one of several seeds on the instance: every share.every iterations
+# the seed publishes its best, and after share.restart_after iterations without a new best it restarts from the
+# global best if that is better. Nothing is written to solutions/ then; the coordinator persists the global best.
+#
+# With time_limit (seconds), the run ends at that deadline and iterations is only an upper limit (None for none):
+# calibration takes the first CALIBRATION_SHARE of the budget, the temperature follows the elapsed time, and the
+# staleness window is sized from the iteration rate reached during calibration (see TimeBudget.py).
+
+# Operators picked by weight; op is the index into this list
+OPERATORS = [
+    one_reinsert,
+    truck_section_reinsert,
+    flatten_section,
+    x_destroy_regret_reinsert,
+    truck_section_reinsert_regret,
+    route_opt,
+    split_relocate,
+]
+
+
+def apply_operator(runner, op, solution, bound=None):
+    #(candidate solution, objective) from operator op on solution
+    if bound is None:
+        return OPERATORS[op](runner, solution)
+    return OPERATORS[op](runner, solution, bound)
+
+
+def adaptive_sa(runner, iterations, filename, share=None, time_limit=None):
+    budget = TimeBudget(time_limit) if time_limit is not None else None
 
-def adaptive_sa(runner, iterations, filename):
     # Save and/or Load from file:
     all_time_best_solution = load_best(filename)
     if all_time_best_solution:
-        all_time_best_objective, _,_,_ = runner.calculate_total_waiting_time(all_time_best_solution)
+        all_time_best_objective, _ = runner.evaluate_cached(all_time_best_solution)
     else:
         all_time_best_objective = float('inf')
     this_run_best_objective = float('inf')
 
 
-    # Calibration split:
-    schedule_split = iterations // 100
+    # Calibration split (with a time budget only an upper limit, set once calibration is over):
+    schedule_split = iterations // 100 if iterations is not None else None
 
     # How often prints for progress are displayed
     progress_split = 1000
@@ -38,14 +70,14 @@ def adaptive_sa(runner, iterations, filename):
     save_split = 1000
     
     #"Staleness" before we promote more exploratory operators:
-    staleness_limit = iterations // 100
+    staleness_limit = iterations // 100 if budget is None else None
 
     delta_w = []
     t_f = 0.1
 
-    ###Weights of operator. Should match nr of operators
-    weights = [1.0, 1.0, 1.0, 1.0, 1.0]
-    avg_delta_e = [0 ,0 ,0 ,0 ,0]
+    ###Weights of operator, one per entry of OPERATORS
+    weights = [1.0] * len(OPERATORS)
+    avg_delta_e = [0] * len(OPERATORS)
     decay = 0.01
 
     # We create a list of objectives, so we can keep track of how the gradient has improved the last X operators
@@ -66,6 +98,9 @@ def adaptive_sa(runner, iterations, filename):
         incumbent_objective = result["objective"]
     else:
         print("ERROR- Initial result is not feasible")
+
+    #Solutions evaluated recently, not evaluated again when an operator proposes them (see Tabu.py)
+    runner.start_tabu(incumbent_solution, incumbent_objective)
     
 
 
@@ -76,6 +111,8 @@ def adaptive_sa(runner, iterations, filename):
     print()
     print()
     print("Iterations: ", iterations, "| Cooling schedule split: ", schedule_split)
+    if budget is not None:
+        print("Time budget:", time_limit, "s")
     print()
     print("Progress will be printed every", progress_split, "iterations")
     print("Progress will be saved every", save_split, "iterations")
@@ -90,7 +127,7 @@ def adaptive_sa(runner, iterations, filename):
     #-- Calibrate cooling schedule
     print()
     print("Cooling schedule:")
-    for w in range(schedule_split):
+    for w in budget_steps(schedule_split, budget, until=CALIBRATION_SHARE, minimum=MIN_CALIBRATION):
 
         #Random number to pass SA-threshold
         rand = random.randint(0,100)
@@ -103,45 +140,45 @@ def adaptive_sa(runner, iterations, filename):
 
 
         #Operation choice
-        op = random.choices([0, 1, 2, 3, 4], weights=weights)[0]
-        if op == 0:
-            candidate_solution, candidate_objective = one_reinsert(runner, incumbent_solution)
-        elif op == 1:
-            candidate_solution, candidate_objective = truck_section_reinsert(runner, incumbent_solution)
-        elif op == 2:
-            candidate_solution, candidate_objective = flatten_section(runner, incumbent_solution)
-        elif op == 3:
-            candidate_solution, candidate_objective = x_destroy_regret_reinsert(runner, incumbent_solution)
-        elif op == 4:
-            candidate_solution, candidate_objective = truck_section_reinsert_regret(runner, incumbent_solution)
-
-
-        # Check feasibility and delta_e
-        candidate_feasible = runner.is_solution_feasible(candidate_solution)
+        op = random.choices(range(len(OPERATORS)), weights=weights)[0]
+        candidate_solution, candidate_objective = apply_operator(runner, op, incumbent_solution)
+
+
+        # Check feasibility and delta_e. A recent solution comes back unevaluated, with its stored objective (see Tabu.py)
+        candidate_objective, candidate_feasible, skipped = runner.evaluate_candidate(candidate_solution)
         delta_e = candidate_objective - incumbent_objective
 
-        #Update accordingly
+        #Update accordingly. A skipped candidate is only counted in delta_w.
         if candidate_feasible and (delta_e < 0):
-            incumbent_solution = copy_solution(candidate_solution)
-            incumbent_objective = candidate_objective
-            
-            if incumbent_objective < best_objective:
-                best_solution = copy_solution(incumbent_solution)
+            if not skipped:
+                incumbent_solution = copy_solution(candidate_solution)
+                incumbent_objective = candidate_objective
+
+                if incumbent_objective < best_objective:
+                    best_solution = copy_solution(incumbent_solution)
 
         elif candidate_feasible:
-            if rand < 0.8: 
+            if rand < 0.8 and not skipped:
                 incumbent_solution = copy_solution(candidate_solution)
                 incumbent_objective = candidate_objective
             delta_w.append(delta_e)
 
 
+    if budget is not None:
+        schedule_split = w + 1
+        staleness_limit = max(budget.estimate_iterations(schedule_split) // 100, 1)
+
     #Now, we can update initial temperatures and cooling based on the tuning.
     if len(delta_w) == 0:
         print("Error, delta_W is empty, likely indicating too small sample size.")
 
     delta_avg = sum(delta_w)/len(delta_w)
     t_0 = (-1 * delta_avg)/(math.log(0.8))
-    alpha = (t_f / t_0) ** (1/(iterations - schedule_split))
+    if budget is None:
+        alpha = (t_f / t_0) ** (1/(iterations - schedule_split))
+    else:
+        # t follows the elapsed time instead
+        alpha = 1.0
     t = t_0
     print()
     #print("Improvements during tuning: ", delta_w)
@@ -157,33 +194,38 @@ def adaptive_sa(runner, iterations, filename):
     max_gradient = 0
     relative_gradient = 0
     basin_obj.append(incumbent_objective)
-
-    for i in range(schedule_split, iterations):
+    published_objective = float('inf')
+    last_improvement = schedule_split
+    iterations_done = schedule_split
+    #Iterations of the last share and save checkpoints. Counted as intervals, so an iteration that ends early
+    #(no candidate) does not make the loop miss a checkpoint.
+    last_share = schedule_split
+    last_save = schedule_split
+
+    for i in budget_steps(iterations, budget, start=schedule_split):
+        iterations_done = i + 1
+        if budget is not None:
+            t = budget.temperature(t_0, t_f, i - schedule_split,
+                                   iterations - schedule_split if iterations is not None else None)
         rand = random.randint(0,100)
         rand = rand/100
 
-        
+        #rand is known before the move, so anything above this objective would be rejected anyway.
+        #The operators stop evaluating a candidate once it passes the bound and return inf for it.
+        bound = acceptance_bound(incumbent_objective, t, rand)
 
 
         #Operation choice
-        op = random.choices([0, 1, 2, 3, 4], weights=weights)[0]
-        if op == 0:
-            candidate_solution, candidate_objective = one_reinsert(runner, incumbent_solution)
-        elif op == 1:
-            candidate_solution, candidate_objective = truck_section_reinsert(runner, incumbent_solution)
-        elif op == 2:
-            candidate_solution, candidate_objective = flatten_section(runner, incumbent_solution)
-        elif op == 3:
-            candidate_solution, candidate_objective = x_destroy_regret_reinsert(runner, incumbent_solution)
-        elif op == 4:
-            candidate_solution, candidate_objective = truck_section_reinsert_regret(runner, incumbent_solution)    
+        op = random.choices(range(len(OPERATORS)), weights=weights)[0]
+        candidate_solution, candidate_objective = apply_operator(runner, op, incumbent_solution, bound)
 
         #If no insertions are found using one-reinsert, it will return none.
         if not candidate_solution:
             continue
 
-        #Double check feasibility
-        candidate_feasible = runner.is_solution_feasible(candidate_solution)
+        #Double check feasibility. A recent solution is not evaluated again (see Tabu.py): its stored objective
+        #still counts in the operator statistics below, but it is not moved to.
+        candidate_objective, candidate_feasible, skipped = runner.evaluate_candidate(candidate_solution, bound)
         delta_e = candidate_objective - incumbent_objective
 
         
@@ -194,7 +236,7 @@ def adaptive_sa(runner, iterations, filename):
         else:
             p = math.exp(-1*delta_e/t) 
         
-        if candidate_feasible and (delta_e < 0):
+        if not skipped and candidate_feasible and (delta_e < 0):
             incumbent_solution = copy_solution(candidate_solution)
             incumbent_objective = candidate_objective
             
@@ -202,9 +244,10 @@ def adaptive_sa(runner, iterations, filename):
             if incumbent_objective < best_objective:
                 best_solution = copy_solution(incumbent_solution)
                 best_objective = incumbent_objective
+                last_improvement = i
             
             
-        elif candidate_feasible and (rand <  p):
+        elif not skipped and candidate_feasible and (rand <  p):
             if delta_e != 0:
                 incumbent_solution = copy_solution(candidate_solution)
                 incumbent_objective = candidate_objective
@@ -227,7 +270,9 @@ def adaptive_sa(runner, iterations, filename):
 
         
 
-        #Update avg delta e for the used operator.
+        #Update avg delta e for the used operator. A pruned candidate is at least as bad as the bound.
+        if candidate_objective == float('inf'):
+            delta_e = bound - incumbent_objective
         avg_delta_e[op] = ((1-decay) * avg_delta_e[op]) + (decay * delta_e)
 
         gradient_normalized = min(1, gradient / relative_gradient) if relative_gradient > 0 else 0
@@ -247,14 +292,43 @@ def adaptive_sa(runner, iterations, filename):
         #     print("Op 3- Weight" ,float(weights[2]), "| Average Delta E:", avg_delta_e[2])
         #     print("Op 4- Weight" ,float(weights[3]), "| Average Delta E:", avg_delta_e[3])
         #     print("Op 5- Weight" ,float(weights[4]), "| Average Delta E:", avg_delta_e[4])
+        #     print("Op 6- Weight" ,float(weights[5]), "| Average Delta E:", avg_delta_e[5])
+        #     print("Op 7- Weight" ,float(weights[6]), "| Average Delta E:", avg_delta_e[6])
         #     print("Gradient Normalized")
         #     print(gradient_normalized)
             
-  
-        if i % save_split == 0:
-            save_to_file(filename, best_solution, best_objective, this_run_best_objective, all_time_best_objective)
 
-    save_to_file(filename, best_solution, best_objective, this_run_best_objective, all_time_best_objective)
+        if share is not None and i - last_share >= share.every:
+            last_share = i
+            if best_objective < published_objective:
+                share.publish(best_solution, best_objective)
+                published_objective = best_objective
+            #Stagnant seed: continue from the global best if another seed is ahead
+            if share.restart_after and i - last_improvement >= share.restart_after:
+                global_objective, global_solution = share.fetch()
+                if global_objective < best_objective:
+                    incumbent_solution = copy_solution(global_solution)
+                    incumbent_objective = global_objective
+                    best_solution = copy_solution(global_solution)
+                    best_objective = global_objective
+                    published_objective = global_objective
+                    basin_obj = [incumbent_objective]
+                last_improvement = i
+  
+        if share is None and i - last_save >= save_split:
+            last_save = i
+            this_run_best_objective, all_time_best_objective = save_to_file(
+                filename, best_solution, best_objective, this_run_best_objective, all_time_best_objective)
+
+    if share is None:
+        this_run_best_objective, all_time_best_objective = save_to_file(
+            filename, best_solution, best_objective, this_run_best_objective, all_time_best_objective)
+        flush_saves()
+    elif best_objective < published_objective:
+        share.publish(best_solution, best_objective)
+    print("Tabu:", runner.tabu_stats())
+    if budget is not None:
+        budget.report(iterations_done)
     return best_solution
 
 def update_weights(avg_delta_e, gradient_normalized, n_operators, i):
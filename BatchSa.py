@@ -0,0 +1,202 @@
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from Common import copy_solution, load_best, save_to_file, flush_saves, acceptance_bound
+from CompactSolution import CompactSolution
+from SolutionRunner import SolutionRunner
+from AdaptiveSa import OPERATORS, apply_operator, update_weights
+from ParallelTempering import temperature_ladder
+from TimeBudget import TimeBudget, budget_steps
+
+
+### BATCH SA:
+# Annealing where every iteration draws batch_size operator moves from the incumbent and runs them on a process pool,
+# for instances where a single x_destroy_regret_reinsert or truck_section_reinsert_regret call is the bottleneck.
+#
+# The truck and drone matrices are put in multiprocessing.shared_memory once; each worker maps them as numpy arrays
+# (no copy) and builds its own runner on them. Per iteration only the incumbent and the candidates cross the process
+# boundary, as CompactSolution (array buffers, no -1 separators), plus the operator index, bound and a seed; the
+# worker runs the operator on the dict form and converts the candidate back.
+#
+# Batch acceptance: rand is drawn before the batch as in adaptive_sa, so every candidate is scored against the same
+# acceptance bound; the best feasible candidate of the batch then goes through the usual Metropolis test.
+# Every move of the batch updates its operator's avg_delta_e, and the weights follow update_weights.
+# With time_limit the loop runs until the deadline, cooling by elapsed time, and the staleness window follows the
+# iteration count the rate so far projects for the whole budget.
+
+t_f = 0.1
+
+# Per worker process: the shared memory blocks (kept open while the process lives) and the runner on them
+_shared = []
+_runner = None
+
+
+class SharedInstance:
+    """The instance matrices in shared memory. spec() is what a worker needs to map them again."""
+
+    def __init__(self, runner):
+        self.blocks = []
+        self.arrays = []
+        for matrix in (runner.truck_times, runner.drone_times):
+            matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+            block = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+            np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=block.buf)[:] = matrix
+            self.blocks.append(block)
+            self.arrays.append((block.name, matrix.shape))
+        self.flight_range = runner.flight_range
+        self.n_drones = runner.n_drones
+        self.n_nodes = runner.n_nodes
+
+    def spec(self):
+        return self.arrays, self.flight_range, self.n_drones, self.n_nodes
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def attach_instance(spec):
+    #Worker initializer: map the shared matrices and build the worker's runner on them
+    global _runner
+    arrays, flight_range, n_drones, n_nodes = spec
+    matrices = []
+    for name, shape in arrays:
+        block = shared_memory.SharedMemory(name=name)
+        _shared.append(block)
+        matrices.append(np.ndarray(shape, dtype=np.float64, buffer=block.buf))
+    truck_times, drone_times = matrices
+    _runner = SolutionRunner(
+        solution=None,
+        truck_times=truck_times,
+        drone_times=drone_times,
+        flight_range_limit=flight_range,
+        n_nodes=n_nodes,
+        n_drones=n_drones,
+    )
+
+
+def score_move(incumbent, op, bound, seed):
+    #Worker: one move of operator op on the incumbent (a CompactSolution). Returns (op, candidate or None, objective,
+    #feasible), the candidate as a CompactSolution again.
+    random.seed(seed)
+    candidate, _ = apply_operator(_runner, op, incumbent.to_dict(), bound)
+    if not candidate:
+        return op, None, float('inf'), False
+    objective, feasible, _ = _runner.evaluate_solution(candidate, bound)
+    if not feasible or objective == float('inf'):
+        # Nothing to accept, so the candidate itself does not have to travel back
+        return op, None, objective, feasible
+    return op, CompactSolution.from_dict(candidate), objective, feasible
+
+
+def batch_sa(runner, iterations, filename, batch_size=8, max_workers=None, time_limit=None):
+    """
+    SA with batch_size candidates per iteration scored on max_workers processes (default batch_size).
+    Starts from runner.solution; returns the best solution found and prints the evaluation throughput.
+    With time_limit (seconds) it stops at that deadline, and iterations is only an upper limit (None for none).
+    """
+    budget = TimeBudget(time_limit) if time_limit is not None else None
+    all_time_best = load_best(filename)
+    all_time_best_objective = runner.evaluate_cached(all_time_best)[0] if all_time_best else float('inf')
+    this_run_best_objective = float('inf')
+    save_split = max(iterations // 10, 1) if budget is None else 100
+    staleness_limit = max(iterations // 100, 1) if budget is None else 1
+    decay = 0.01
+    max_workers = max_workers or batch_size
+
+    incumbent_solution = copy_solution(runner.solution)
+    incumbent_objective, feasible, _ = runner.evaluate_solution(incumbent_solution)
+    if not feasible:
+        print("ERROR- Initial result is not feasible")
+        return None
+    best_solution, best_objective = copy_solution(incumbent_solution), incumbent_objective
+
+    # No calibration phase: t_0 by adaptive_sa's rule on a sample of moves, then geometric cooling to t_f
+    t_0 = temperature_ladder(runner, incumbent_solution, incumbent_objective, 1)[0]
+    # With a budget, t follows the elapsed time instead
+    alpha = (t_f / t_0) ** (1 / iterations) if budget is None else 1.0
+    t = t_0
+
+    weights = [1.0] * len(OPERATORS)
+    avg_delta_e = [0] * len(OPERATORS)
+    basin_obj = [incumbent_objective]
+    relative_gradient = 0
+
+    print("=== Batch Simulated Annealing ===")
+    print(filename, "| Iterations:", iterations, "| Batch size:", batch_size, "| Workers:", max_workers)
+    print("Initial objective:", incumbent_objective, "| Initial temperature:", t_0)
+
+    shared = SharedInstance(runner)
+    evaluations = 0
+    start_time = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=attach_instance,
+                                 initargs=(shared.spec(),)) as executor:
+            for i in budget_steps(iterations, budget):
+                if budget is not None:
+                    t = budget.temperature(t_0, t_f, i, iterations)
+                    staleness_limit = max(budget.estimate_iterations(i) // 100, 1)
+                rand = random.randint(0, 100) / 100
+                bound = acceptance_bound(incumbent_objective, t, rand)
+                ops = random.choices(range(len(OPERATORS)), weights=weights, k=batch_size)
+                seeds = [random.getrandbits(32) for _ in ops]
+
+                compact = CompactSolution.from_dict(incumbent_solution)
+                results = list(executor.map(score_move, [compact] * batch_size, ops, [bound] * batch_size, seeds))
+                evaluations += batch_size
+                previous_objective = incumbent_objective
+
+                # Best feasible candidate of the batch
+                chosen = None
+                for op, candidate, objective, feasible in results:
+                    if candidate is not None and (chosen is None or objective < chosen[1]):
+                        chosen = (candidate, objective)
+
+                if chosen is not None:
+                    delta_e = chosen[1] - incumbent_objective
+                    if delta_e < 0:
+                        incumbent_solution, incumbent_objective = chosen[0].to_dict(), chosen[1]
+                        if incumbent_objective < best_objective:
+                            best_solution, best_objective = copy_solution(incumbent_solution), incumbent_objective
+                    elif delta_e != 0 and rand < math.exp(-delta_e / t):
+                        incumbent_solution, incumbent_objective = chosen[0].to_dict(), chosen[1]
+                        relative_gradient = (incumbent_objective - best_objective) / 100
+                        basin_obj = []
+
+                basin_obj.insert(0, incumbent_objective)
+                while len(basin_obj) > staleness_limit:
+                    basin_obj.pop()
+                gradient = basin_obj[-1] - incumbent_objective
+                t = alpha * t
+
+                #A pruned candidate is at least as bad as the bound
+                for op, candidate, objective, feasible in results:
+                    if objective == float('inf'):
+                        if bound == float('inf'):
+                            continue
+                        objective = bound
+                    avg_delta_e[op] = ((1 - decay) * avg_delta_e[op]) + (decay * (objective - previous_objective))
+                gradient_normalized = min(1, gradient / relative_gradient) if relative_gradient > 0 else 0
+                weights = update_weights(avg_delta_e, gradient_normalized, len(weights), i)
+
+                if i % save_split == 0:
+                    this_run_best_objective, all_time_best_objective = save_to_file(
+                        filename, best_solution, best_objective, this_run_best_objective, all_time_best_objective)
+    finally:
+        shared.close()
+
+    elapsed = time.perf_counter() - start_time
+    this_run_best_objective, all_time_best_objective = save_to_file(
+        filename, best_solution, best_objective, this_run_best_objective, all_time_best_objective)
+    flush_saves()
+    print("Best objective:", best_objective)
+    if budget is not None:
+        budget.report(evaluations // batch_size)
+    print("Evaluations:", evaluations, "| per second:", round(evaluations / elapsed), "| per second per worker:",
+          round(evaluations / elapsed / max_workers))
+    return best_solution
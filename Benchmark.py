@@ -0,0 +1,159 @@
+import random
+import time
+import io
+import contextlib
+from InitialSolution import create_initial_runner
+from CreateInitSolution import create_initial_solution
+from OneReinsert import one_reinsert
+from LocalSearch import local_search
+from Common import copy_solution
+from RouteOpt import route_opt, route_polish, node_moves, truck_neighbours
+
+
+### BENCHMARKS:
+# Throughput measurements for the evaluator and the operators. Run directly:
+#   python Benchmark.py
+
+
+def sample_solutions(runner, n_samples, seed=0):
+    #Random walk with one_reinsert from the constructed start, keeping every feasible candidate.
+    #Gives a realistic mix of truck/drone assignments for an instance.
+    random.seed(seed)
+    solution = create_initial_solution(runner)
+    samples = []
+    while len(samples) < n_samples:
+        candidate, objective = one_reinsert(runner, solution)
+        if candidate and runner.is_solution_feasible(candidate):
+            solution = candidate
+            samples.append(copy_solution(candidate))
+    return samples
+
+
+def evaluations_per_second(evaluate, solutions, duration):
+    start = time.perf_counter()
+    n = 0
+    while time.perf_counter() - start < duration:
+        evaluate(solutions)
+        n += len(solutions)
+    return n / (time.perf_counter() - start)
+
+
+def benchmark_batch_evaluation(filename, batch_sizes=(16, 64, 256), duration=1.0):
+    runner = create_initial_runner(filename)
+    samples = sample_solutions(runner, max(batch_sizes))
+
+    def scalar(solutions):
+        for solution in solutions:
+            runner.calculate_total_waiting_time(solution)
+
+    print("=== Batched evaluation:", filename, "===")
+    for batch_size in batch_sizes:
+        batch = samples[:batch_size]
+        scalar_rate = evaluations_per_second(scalar, batch, duration)
+        batch_rate = evaluations_per_second(runner.calculate_total_waiting_time_batch, batch, duration)
+        print("Batch size", batch_size, "| scalar:", round(scalar_rate), "evals/s | batched:", round(batch_rate),
+              "evals/s | speedup:", round(batch_rate / scalar_rate, 2))
+    print()
+
+
+def compare_backends(filename, n_samples=200, duration=1.0):
+    #The compiled kernel has to reproduce the Python evaluator exactly, not just closely.
+    python_runner = create_initial_runner(filename)
+    python_runner.select_backend("python")
+    numba_runner = create_initial_runner(filename)
+    numba_runner.select_backend("numba")
+    samples = sample_solutions(python_runner, n_samples)
+
+    mismatches = 0
+    for solution in samples:
+        python_total, _, _, python_feas = python_runner.calculate_total_waiting_time(solution)
+        numba_total, _, _, numba_feas = numba_runner.calculate_total_waiting_time(solution)
+        if python_total != numba_total or python_feas != numba_feas:
+            mismatches += 1
+
+    def evaluate_with(runner):
+        def evaluate(solutions):
+            for solution in solutions:
+                runner.calculate_total_waiting_time(solution)
+        return evaluate
+
+    python_rate = evaluations_per_second(evaluate_with(python_runner), samples, duration)
+    numba_rate = evaluations_per_second(evaluate_with(numba_runner), samples, duration)
+    print(filename, "| backend:", numba_runner.backend, "| mismatches:", mismatches, "/", len(samples),
+          "| python:", round(python_rate), "evals/s |", numba_runner.backend + ":", round(numba_rate), "evals/s")
+    return mismatches
+
+
+def compare_granular(filename, ks=(None, 20, 10, 5), iterations=2000, seeds=(0, 1, 2)):
+    #Local search from the constructed start with the exhaustive insertion scan (k=None) and with k-nearest lists.
+    #Reports the mean final objective and run time per setting.
+    runner = create_initial_runner(filename)
+    start = create_initial_solution(runner)
+    print("=== Granular insertion lists:", filename, "===")
+    for k in ks:
+        runner.set_granular_k(k)
+        objectives = []
+        start_time = time.perf_counter()
+        for seed in seeds:
+            random.seed(seed)
+            runner.solution = copy_solution(start)
+            with contextlib.redirect_stdout(io.StringIO()):
+                best = local_search(runner, iterations)
+            objectives.append(runner.calculate_total_waiting_time(best)[0])
+        elapsed = (time.perf_counter() - start_time) / len(seeds)
+        print("k:", "all" if k is None else k, "| mean objective:", round(sum(objectives) / len(objectives), 1),
+              "| time per run:", round(elapsed, 2), "s")
+    runner.set_granular_k(None)
+    print()
+
+
+def benchmark_route_opt(filename, n_samples=50, duration=1.0):
+    #Moves scored per second by the 2-opt/Or-opt operator, and what route_polish makes of the constructed start.
+    runner = create_initial_runner(filename)
+    samples = sample_solutions(runner, n_samples)
+    neighbours = truck_neighbours(runner)
+
+    # Moves around an average node, route_opt scores all of them
+    moves_per_node = [len(node_moves(solution, neighbours, node)) for solution in samples for node in solution["part1"][1:-1]]
+    moves_per_call = sum(moves_per_node) / len(moves_per_node)
+
+    random.seed(0)
+    n_calls = 0
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < duration:
+        route_opt(runner, samples[n_calls % len(samples)])
+        n_calls += 1
+    elapsed = time.perf_counter() - start_time
+
+    start = create_initial_solution(runner)
+    start_objective = runner.calculate_total_waiting_time(start)[0]
+    polish_time = time.perf_counter()
+    polished, polished_objective = route_polish(runner, start)
+    polish_time = time.perf_counter() - polish_time
+    print("=== Route 2-opt/Or-opt:", filename, "===")
+    print("route_opt:", round(n_calls / elapsed), "calls/s |", round(moves_per_call, 1), "moves per call |",
+          round(n_calls * moves_per_call / elapsed), "moves scored/s")
+    print("route_polish on the constructed start:", start_objective, "->", polished_objective,
+          "| time:", round(polish_time, 3), "s")
+    print()
+
+
+if __name__ == "__main__":
+    filenames = [
+        "Data/F_100.txt",
+        "Data/R_100.txt",
+    ]
+    for filename in filenames:
+        benchmark_batch_evaluation(filename)
+
+    print("=== Compiled evaluation kernel ===")
+    for filename in ["Data/F_10.txt", "Data/R_10.txt", "Data/F_20.txt", "Data/R_20.txt",
+                     "Data/F_50.txt", "Data/R_50.txt", "Data/F_100.txt", "Data/R_100.txt"]:
+        compare_backends(filename)
+
+    for filename in ["Data/F_10.txt", "Data/R_10.txt", "Data/F_20.txt", "Data/R_20.txt",
+                     "Data/F_50.txt", "Data/R_50.txt", "Data/F_100.txt", "Data/R_100.txt"]:
+        compare_granular(filename)
+
+    for filename in ["Data/F_100.txt", "Data/R_100.txt"]:
+        benchmark_route_opt(filename)
@@ -1,133 +1,640 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
+import numpy as np
+from NumbaKernel import NUMBA_AVAILABLE, compiled_total_waiting_time, kernel_matrices
+from CompactSolution import CompactSolution
 
 
 class CalCulateTotalArrivalTime:
-    def calculate_total_waiting_time(self, solution: Dict[str, Any]) -> float:
+    def build_lookups(self) -> None:
+        """
+        Convert the instance matrices to nested Python lists once.
+        Indexing a NumPy array with two ints (and doing arithmetic on the returned NumPy scalars)
+        is several times slower than plain list lookups, and this is the innermost loop of every operator.
+        """
+        self.truck_lookup = self.truck_times.tolist() if hasattr(self.truck_times, "tolist") else [list(row) for row in self.truck_times]
+        self.drone_lookup = self.drone_times.tolist() if hasattr(self.drone_times, "tolist") else [list(row) for row in self.drone_times]
+
+    def select_backend(self, backend: str = "auto") -> None:
+        """
+        Pick the implementation behind calculate_total_waiting_time:
+        "python", "numba" (compiled kernel, see NumbaKernel.py) or "auto" (numba when it is installed).
+        Both give bit-identical objectives; without Numba the Python evaluator is always used.
+        """
+        if backend not in ("auto", "python", "numba"):
+            raise ValueError(f"Unknown evaluation backend: {backend}")
+        if backend == "auto":
+            backend = "numba" if NUMBA_AVAILABLE else "python"
+        elif backend == "numba" and not NUMBA_AVAILABLE:
+            print("Numba is not installed, using the Python evaluator.")
+            backend = "python"
+
+        self.backend = backend
+        if backend == "numba":
+            self.kernel_truck_times, self.kernel_drone_times = kernel_matrices(self.truck_times, self.drone_times)
+
+    def decode_flights(self, solution: Dict[str, Any]) -> Tuple[List[List[Tuple[int, int, int]]], int]:
+        """
+        Decode part2/part3/part4 into a return-indexed trip table.
+        returns[i] holds (customer, launch_idx, drone) for every flight that reconvenes at truck position i (0-based),
+        in the same order the flights are listed in part2 (drone 0 first, then drone 1).
+        Flights that reconvene outside 0..len(part1)-1 are left out; position 0 is kept in the table
+        (but never simulated) so that a shifted copy of the solution still sees those flights.
+        """
+        if isinstance(solution, CompactSolution):
+            return self.decode_compact_flights(solution)
+
+        n = len(solution["part1"])
+        part2 = solution["part2"]
+
+        # Clean separators (-1). Launch/reconvene cells are 1-based, positions in the table are 0-based.
+        part3_clean = [x for x in solution["part3"] if x != -1]
+        part4_clean = [x for x in solution["part4"] if x != -1]
+
+        returns = [[] for _ in range(n)]
+        drone = 0
+        k = 0
+        for c in part2:
+            if c == -1:
+                drone += 1
+                continue
+            return_idx = int(part4_clean[k]) - 1
+            if 0 <= return_idx < n:
+                returns[return_idx].append((c, int(part3_clean[k]) - 1, drone))
+            k += 1
+
+        return returns, drone + 1
+
+    def decode_compact_flights(self, solution: CompactSolution) -> Tuple[List[List[Tuple[int, int, int]]], int]:
+        #Same table as decode_flights, read straight from the per-drone arrays
+        n = len(solution.truck)
+        returns = [[] for _ in range(n)]
+        for drone, (customers, launches, reconvenes) in enumerate(zip(solution.customers, solution.launches, solution.reconvenes)):
+            for c, launch_cell, reconvene_cell in zip(customers, launches, reconvenes):
+                if 0 < reconvene_cell <= n:
+                    returns[reconvene_cell - 1].append((c, launch_cell - 1, drone))
+        return returns, len(solution.customers)
+
+    def calculate_total_waiting_time(self, solution: Dict[str, Any], bound: float = None) -> float:
         """
         Iteratively compute total arrival time (objective) for STRPD with full truck–drone synchronization.
         Each drone has its own availability timeline — it cannot start a new mission before:
         - the truck arrives at the launch node, AND
         - the drone is available from its previous return.
+
+        Arrival and departure times are returned as lists indexed by truck position.
+
+        bound: optional upper bound on the objective. The objective only grows along the route, so once the
+        partial sum passes the bound the walk stops and the objective is returned as inf (feasibility is then unknown
+        and reported as True, so callers simply see a candidate that is too expensive).
         """
-        
+        if self.backend == "numba":
+            result = compiled_total_waiting_time(self, solution, bound)
+            if result is not None:
+                return result
+
+        truck_times = self.truck_lookup
+        drone_times = self.drone_lookup
+
         feas = True
 
         truck_route = solution["part1"]
-        part2 = solution["part2"]
-        part3 = solution["part3"]
-        part4 = solution["part4"]
-
-        # Clean separators (-1) and convert to ints
-        part3_clean = [int(x) for x in part3 if x != -1]
-        part4_clean = [int(x) for x in part4 if x != -1]
-
-        # Split UAV customers by drone (using -1)
-        drone_routes = []
-        current = []
-        for x in part2:
-            if x == -1:
-                drone_routes.append(current)
-                current = []
-            else:
-                current.append(x)
-        drone_routes.append(current)
-
-        # Map each drone's flights: (cust, launch_idx, return_idx)
-        drone_flights = []
-        start_idx = 0
-        for drone_customers in drone_routes:
-            flights = []
-            for c in drone_customers:
-                launch_idx = part3_clean[start_idx] - 1  # 1-based → 0-based
-                return_idx = part4_clean[start_idx] - 1
-                # ############################################################### TODO! #Replaced this because I assume null-indexing from the get-go
-                # launch_idx = part3_clean[start_idx]
-                # return_idx = part4_clean[start_idx]
-                # ############################################################### TODO! #WILL CAUSE ERRORS IF SOLUTIONS ARE SUPPOSED TO BE 1-INDEXED!
-                flights.append((c, launch_idx, return_idx))
-                start_idx += 1
-            drone_flights.append(flights)
+        n = len(truck_route)
+        returns, n_drone_routes = self.decode_flights(solution)
 
         # Initialize truck timeline
         depot_index = self.depot_index
-        t_arrival = {depot_index: 0}
-        t_departure = {depot_index: 0}
+        flight_range = self.flight_range
+        limit = bound * 100.0 if bound is not None else float('inf')
+        t_arrival = [0] * n
+        t_departure = [0] * n
         total_time = 0
-        drone_availability = [0] * len(drone_flights)
-        
-        for i in range(1, len(truck_route)):
-            prev_node = truck_route[i - 1]
+        drone_availability = [0] * n_drone_routes
+
+        for i in range(1, n):
             curr_node = truck_route[i]
-            
-           
-            truck_travel = self.truck_times[prev_node][curr_node]
-            truck_arrival = t_departure[prev_node] + truck_travel
-            t_arrival[curr_node] = truck_arrival
-            #print("\nTruck departs from",prev_node,"at time",t_departure[prev_node],"at",prev_node,
-            #      "and travels for a time of",truck_travel,"to arrive",curr_node,"at time",t_arrival[curr_node])
-            
-            #print("Delay in next departure due to waiting for drone landings at",curr_node,":")   
-
-            # Check returning drones
-            drone_returns = []
-            for u, flights in enumerate(drone_flights):
-                for (cust, launch_idx, return_idx) in flights:
-                    if return_idx == i:
-                        launch_node = truck_route[launch_idx]
-                        return_node = truck_route[return_idx]
-                        flight_out = self.drone_times[launch_node][cust]
-                        flight_back = self.drone_times[cust][return_node]
-                        total_flight = flight_out + flight_back
-                        #print("Flight of drone",u,":",launch_node,"->",cust,"(travel time=",self.drone_times[launch_node][cust],")",
-                        #      "->",return_node,"(travel time=",self.drone_times[cust][return_node],")")    
-                        #print("Drone arrival time at launch node",launch_node,":",drone_availability[u],
-                        #      "Truck arrival time at launch node",launch_node,":",t_arrival[launch_node])
-                        
-                        # Drone cannot depart before both truck and its own availability
-                        possible_launch_time = t_arrival[launch_node]
-                        if launch_node == 0: possible_launch_time = 0; 
-                        actual_launch_time = max(possible_launch_time, drone_availability[u])
-                                                     
-                        drone_arrival_customer = actual_launch_time + flight_out
-                        drone_return_time = actual_launch_time + total_flight
-                        drone_availability[u] = drone_return_time
-                        drone_returns.append(drone_return_time)
-                        total_time += drone_arrival_customer
-                        
-                        drone_wait = max(t_arrival[curr_node]-drone_return_time,0) if curr_node != 0 else 0
-                        
-                        #print("Drone return time = ",drone_return_time," Truck arrivalt time = ",t_arrival[curr_node])
-                        total_flight_ =  total_flight + drone_wait
-                        
-                        #print("Flight start time at",launch_node,":",actual_launch_time,"Drone arrival time at customer",cust,":",drone_arrival_customer,
-                        #      "Drone return time at",return_node,":",drone_return_time,"flight time = ",total_flight_)
-                        
-                        #"""
-                        if total_flight_ > self.flight_range:
-                           feas = False
-                           return total_time, t_arrival, t_departure, feas
-                        #"""   
-
-             #Truck waits for the latest returning drone
-            if drone_returns:
-                latest_drone = max(drone_returns)
-                t_departure[curr_node] = max(truck_arrival, latest_drone)
+            truck_arrival = t_departure[i - 1] + truck_times[truck_route[i - 1]][curr_node]
+            t_arrival[i] = truck_arrival
+
+            # Drones reconvening at this truck position
+            latest_drone = None
+            for cust, launch_idx, u in returns[i]:
+                launch_node = truck_route[launch_idx]
+                flight_out = drone_times[launch_node][cust]
+                total_flight = flight_out + drone_times[cust][curr_node]
+
+                # Drone cannot depart before both truck and its own availability
+                possible_launch_time = t_arrival[launch_idx] if launch_node != 0 else 0
+                actual_launch_time = max(possible_launch_time, drone_availability[u])
+
+                drone_return_time = actual_launch_time + total_flight
+                drone_availability[u] = drone_return_time
+                if latest_drone is None or drone_return_time > latest_drone:
+                    latest_drone = drone_return_time
+                total_time += actual_launch_time + flight_out
+
+                # Time spent hovering while waiting for the truck counts towards the flight range
+                drone_wait = max(truck_arrival - drone_return_time, 0) if curr_node != 0 else 0
+                if total_flight + drone_wait > flight_range:
+                    feas = False
+                    return total_time, t_arrival, t_departure, feas
+
+            # Truck waits for the latest returning drone
+            if latest_drone is not None:
+                t_departure[i] = max(truck_arrival, latest_drone)
             else:
-                t_departure[curr_node] = truck_arrival
-                
-            #print("Next departure time for truck at",curr_node,"after waiting to receive all drones:",t_departure[curr_node]) 
+                t_departure[i] = truck_arrival
 
             if curr_node != depot_index:
                 total_time += truck_arrival
 
+            if total_time > limit:
+                return float('inf'), t_arrival, t_departure, feas
+
         # Final adjustment: convert from seconds to minutes (or 100-unit scale)
         total_time /= 100.0
+        if bound is not None and total_time > bound:
+            return float('inf'), t_arrival, t_departure, feas
+
+        return total_time, t_arrival, t_departure, feas
 
+    # ----------------------------------------------------------------------
+    # Prefix-timing cache and delta evaluation
+    # ----------------------------------------------------------------------
+    def build_timing_cache(self, solution: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Simulate the solution once and keep the state after every truck position:
+        arrival, departure, drone availability and the running (unscaled) objective.
+        The cache is the base for the evaluate_* delta methods below, which only re-simulate
+        the part of the route that a move actually changes.
         """
-        print("\n=== FINAL TIMINGS ===")
-        for k in t_arrival:
-            print(f"Truck node {k}: arrival={t_arrival[k]:.1f}, depart={t_departure[k]:.1f}")
-        print("=====================\n")
-        #"""
+        truck_times = self.truck_lookup
+        drone_times = self.drone_lookup
+        depot_index = self.depot_index
+        flight_range = self.flight_range
 
-        return total_time, t_arrival, t_departure, feas
+        truck_route = list(solution["part1"])
+        n = len(truck_route)
+        returns, n_drone_routes = self.decode_flights(solution)
+
+        # launches[p] holds the customers of the flights that leave from truck position p,
+        # returned_at maps each of those customers to the position it reconvenes at
+        launches = [[] for _ in range(n)]
+        returned_at = {}
+        for i, bucket in enumerate(returns):
+            for cust, launch_idx, u in bucket:
+                returned_at[cust] = i
+                if 0 <= launch_idx < n:
+                    launches[launch_idx].append(cust)
+
+        t_arrival = [0] * n
+        t_departure = [0] * n
+        totals = [0] * n
+        availability = [None] * n
+        drone_availability = [0] * n_drone_routes
+        availability[0] = drone_availability[:]
+        total_time = 0
+        feas = True
+        valid = n
+
+        for i in range(1, n):
+            curr_node = truck_route[i]
+            truck_arrival = t_departure[i - 1] + truck_times[truck_route[i - 1]][curr_node]
+            t_arrival[i] = truck_arrival
+
+            latest_drone = None
+            for cust, launch_idx, u in returns[i]:
+                launch_node = truck_route[launch_idx]
+                flight_out = drone_times[launch_node][cust]
+                total_flight = flight_out + drone_times[cust][curr_node]
+                possible_launch_time = t_arrival[launch_idx] if launch_node != 0 else 0
+                actual_launch_time = max(possible_launch_time, drone_availability[u])
+                drone_return_time = actual_launch_time + total_flight
+                drone_availability[u] = drone_return_time
+                if latest_drone is None or drone_return_time > latest_drone:
+                    latest_drone = drone_return_time
+                total_time += actual_launch_time + flight_out
+
+                drone_wait = max(truck_arrival - drone_return_time, 0) if curr_node != 0 else 0
+                if total_flight + drone_wait > flight_range:
+                    feas = False
+                    break
+
+            if not feas:
+                # State is only known for the positions before the failing one
+                valid = i
+                break
+
+            if latest_drone is not None:
+                t_departure[i] = max(truck_arrival, latest_drone)
+            else:
+                t_departure[i] = truck_arrival
+
+            if curr_node != depot_index:
+                total_time += truck_arrival
+
+            totals[i] = total_time
+            availability[i] = drone_availability[:]
+
+        return {
+            "route": truck_route,
+            "returns": returns,
+            "launches": launches,
+            "returned_at": returned_at,
+            "arrival": t_arrival,
+            "departure": t_departure,
+            "availability": availability,
+            "totals": totals,
+            "n_drones": n_drone_routes,
+            "end": total_time,
+            "feas": feas,
+            "valid": valid,
+        }
+
+    def resimulate(self, cache, route, start, pivot=0, shift=0, overrides=None, limit=float('inf')):
+        """
+        Re-simulate a modified version of the cached solution from truck position `start` onward.
+
+        route     : the modified truck route.
+        pivot/shift: new positions >= pivot correspond to cached positions p - shift,
+                     and cached launch positions >= pivot - shift move by `shift`.
+        overrides : {new position: (returns, launches)} for positions whose flights differ from the cache,
+                    given in new coordinates.
+
+        Everything before `start` must be unchanged. The walk stops as soon as the truck is back at the same node
+        with the same departure time, drone availability and open flights as in the cache; the rest of the objective is then taken from the cache.
+        Returns the unscaled objective and feasibility, like calculate_total_waiting_time before the division by 100.
+        The walk also stops once the unscaled objective passes `limit`; the objective is then inf.
+        """
+        truck_times = self.truck_lookup
+        drone_times = self.drone_lookup
+        depot_index = self.depot_index
+        flight_range = self.flight_range
+
+        if overrides is None:
+            overrides = {}
+        cached_returns = cache["returns"]
+        cached_launches = cache["launches"]
+        cached_arrival = cache["arrival"]
+        cached_departure = cache["departure"]
+        cached_availability = cache["availability"]
+        cached_totals = cache["totals"]
+        cached_route = cache["route"]
+        valid = cache["valid"]
+        n_old = len(cached_returns)
+        launch_pivot = pivot - shift
+
+        if start < 1:
+            start = 1
+        if start - 1 >= valid:
+            # The cached solution already fails in the unchanged prefix
+            return cache["end"], False
+        n = len(route)
+        t_arrival = cached_arrival[:start] + [0] * (n - start)
+        departure = cached_departure[start - 1]
+        drone_availability = cached_availability[start - 1][:]
+        total_time = cached_totals[start - 1]
+
+        # Flights in the air whose launch time may differ from the cached one
+        dirty = set()
+
+        for i in range(start, n):
+            curr_node = route[i]
+            truck_arrival = departure + truck_times[route[i - 1]][curr_node]
+            t_arrival[i] = truck_arrival
+
+            if i in overrides:
+                returns, launches = overrides[i]
+                q = -1
+            else:
+                q = i - shift if i >= pivot else i
+                if 0 <= q < n_old:
+                    returns = cached_returns[q]
+                    launches = cached_launches[q]
+                else:
+                    returns = launches = ()
+                    q = -1
+
+            latest_drone = None
+            for cust, launch_idx, u in returns:
+                if q != -1 and launch_idx >= launch_pivot:
+                    launch_idx += shift
+                launch_node = route[launch_idx]
+                flight_out = drone_times[launch_node][cust]
+                total_flight = flight_out + drone_times[cust][curr_node]
+                possible_launch_time = t_arrival[launch_idx] if launch_node != 0 else 0
+                actual_launch_time = max(possible_launch_time, drone_availability[u])
+                drone_return_time = actual_launch_time + total_flight
+                drone_availability[u] = drone_return_time
+                if latest_drone is None or drone_return_time > latest_drone:
+                    latest_drone = drone_return_time
+                total_time += actual_launch_time + flight_out
+                dirty.discard(cust)
+
+                drone_wait = max(truck_arrival - drone_return_time, 0) if curr_node != 0 else 0
+                if total_flight + drone_wait > flight_range:
+                    return total_time, False
+
+            if latest_drone is not None and latest_drone > truck_arrival:
+                departure = latest_drone
+            else:
+                departure = truck_arrival
+
+            if curr_node != depot_index:
+                total_time += truck_arrival
+
+            if total_time > limit:
+                return float('inf'), True
+
+            if launches and (q == -1 or truck_arrival != cached_arrival[q] or curr_node != cached_route[q]):
+                dirty.update(launches)
+
+            # Timelines line up with the cache again: the remainder of the route is unchanged
+            if q != -1 and q < valid and not dirty and curr_node == cached_route[q] \
+                    and departure == cached_departure[q] and drone_availability == cached_availability[q]:
+                total_time += cache["end"] - cached_totals[q]
+                if not cache["feas"]:
+                    return total_time, False
+                if total_time > limit:
+                    return float('inf'), True
+                return total_time, True
+
+        return total_time, True
+
+    def scaled_delta_result(self, total, feas, bound):
+        #Scale a resimulate() result like calculate_total_waiting_time does and apply the bound
+        if total == float('inf'):
+            return total, feas
+        total /= 100.0
+        if bound is not None and feas and total > bound:
+            return float('inf'), feas
+        return total, feas
+
+    def evaluate_truck_insert(self, cache, node, position, bound=None):
+        """
+        Objective and feasibility of the cached solution with `node` inserted into part1 at index `position`,
+        with every launch/reconvene cell >= position moved one step back (as the reinsert operators build it).
+        """
+        route = cache["route"]
+        route = route[:position] + [node] + route[position:]
+        # The cell that used to be `position` now points at the new node, so the position before it loses its flights
+        total, feas = self.resimulate(
+            cache, route, position - 1, pivot=position, shift=1, overrides={position - 1: ((), ())},
+            limit=bound * 100.0 if bound is not None else float('inf'),
+        )
+        return self.scaled_delta_result(total, feas, bound)
+
+    def evaluate_section_insert(self, cache, section, position, flights=(), depot_flights=(), bound=None):
+        """
+        Objective and feasibility of the cached solution with the truck nodes `section` inserted into part1 at index
+        `position`. Cached launch/reconvene positions from `position` on move back by len(section), so the cached
+        flights keep their truck nodes.
+        flights       : (customer, launch offset, reconvene offset, drone) of sorties within the section,
+                        offsets being indexes into `section`.
+        depot_flights : (customer, launch offset, drone) of sorties launched in the section that reconvene
+                        at the closing depot.
+        """
+        route = cache["route"]
+        k = len(section)
+        new_route = route[:position] + list(section) + route[position:]
+
+        returns = [[] for _ in range(k)]
+        launches = [[] for _ in range(k)]
+        for cust, launch, reconvene, drone in flights:
+            returns[reconvene].append((cust, position + launch, drone))
+            launches[launch].append(cust)
+        for cust, launch, drone in depot_flights:
+            launches[launch].append(cust)
+        # Within a position, flights are processed drone by drone in launch order (the order of part2)
+        overrides = {}
+        for j in range(k):
+            returns[j].sort(key=lambda x: (x[2], x[1]))
+            overrides[position + j] = (returns[j], launches[j])
+
+        if depot_flights:
+            last = len(route) - 1
+            bucket = [(cust, launch_idx + k if launch_idx >= position else launch_idx, drone)
+                      for cust, launch_idx, drone in cache["returns"][last]]
+            bucket += [(cust, position + launch, drone) for cust, launch, drone in depot_flights]
+            bucket.sort(key=lambda x: (x[2], x[1]))
+            overrides[last + k] = (bucket, cache["launches"][last])
+
+        total, feas = self.resimulate(
+            cache, new_route, position, pivot=position + k, shift=k, overrides=overrides,
+            limit=bound * 100.0 if bound is not None else float('inf'),
+        )
+        return self.scaled_delta_result(total, feas, bound)
+
+    def evaluate_truck_reorder(self, cache, start, order, bound=None):
+        """
+        Objective and feasibility of the cached solution with the truck positions start..start+len(order)-1 reordered:
+        new position start + j holds the node of cached position order[j]. Every flight keeps its truck nodes,
+        so launch/reconvene positions follow the nodes they point at (part2 keeps its order).
+        """
+        route = cache["route"]
+        returns = cache["returns"]
+        launches = cache["launches"]
+        end = start + len(order)
+        new_route = route[:start] + [route[p] for p in order] + route[end:]
+        moved = {p: start + j for j, p in enumerate(order) if p != start + j}
+
+        def remapped(bucket):
+            return [(cust, moved.get(launch_idx, launch_idx), u) for cust, launch_idx, u in bucket]
+
+        # Every position of the range is given, so the walk cannot take a node that stayed in place
+        # for the point where the timelines line up again while the route after it still differs
+        overrides = {}
+        for j, p in enumerate(order):
+            overrides[start + j] = (remapped(returns[p]), launches[p])
+        # Flights launched from a moved position that reconvene after the reordered range
+        returned_at = cache["returned_at"]
+        for p in moved:
+            for cust in launches[p]:
+                r = returned_at[cust]
+                if r >= end and r not in overrides:
+                    overrides[r] = (remapped(returns[r]), launches[r])
+
+        total, feas = self.resimulate(
+            cache, new_route, start, overrides=overrides,
+            limit=bound * 100.0 if bound is not None else float('inf'),
+        )
+        return self.scaled_delta_result(total, feas, bound)
+
+    def evaluate_sortie_insert(self, cache, node, launch_cell, reconvene_cell, drone, bound=None):
+        """
+        Objective and feasibility of the cached solution with a new sortie (node, launch_cell, reconvene_cell)
+        added to `drone`. Cells are 1-based like part3/part4. Launch times are only used when a flight reconvenes,
+        so nothing before the reconvene position changes and the re-simulation starts there.
+        """
+        return_idx = reconvene_cell - 1
+        returns = cache["returns"]
+        if not 0 < return_idx < len(returns):
+            return self.scaled_delta_result(cache["end"], cache["feas"], bound)
+
+        # Within a position, flights are processed drone by drone in launch order (the order of part2)
+        launch_idx = launch_cell - 1
+        bucket = list(returns[return_idx])
+        k = 0
+        while k < len(bucket) and (bucket[k][2] < drone or (bucket[k][2] == drone and bucket[k][1] < launch_idx)):
+            k += 1
+        bucket.insert(k, (node, launch_idx, drone))
+
+        total, feas = self.resimulate(
+            cache, cache["route"], return_idx, pivot=len(returns),
+            overrides={return_idx: (bucket, cache["launches"][return_idx])},
+            limit=bound * 100.0 if bound is not None else float('inf'),
+        )
+        return self.scaled_delta_result(total, feas, bound)
+
+    def evaluate_sortie_remove(self, cache, node, bound=None):
+        """
+        Objective and feasibility of the cached solution with the sortie serving `node` removed.
+        """
+        return_idx = cache["returned_at"].get(node)
+        returns = cache["returns"]
+        if return_idx is None or return_idx == 0:
+            return self.scaled_delta_result(cache["end"], cache["feas"], bound)
+
+        bucket = [flight for flight in returns[return_idx] if flight[0] != node]
+        total, feas = self.resimulate(
+            cache, cache["route"], return_idx, pivot=len(returns),
+            overrides={return_idx: (bucket, cache["launches"][return_idx])},
+            limit=bound * 100.0 if bound is not None else float('inf'),
+        )
+        return self.scaled_delta_result(total, feas, bound)
+
+    # ----------------------------------------------------------------------
+    # Batched evaluation
+    # ----------------------------------------------------------------------
+    def calculate_total_waiting_time_batch(self, solutions: List[Dict[str, Any]], bound: float = None):
+        """
+        Evaluate K solutions of this instance at once.
+
+        The candidates are packed into padded (K, positions, drones) arrays and the truck timeline is advanced
+        for all of them together, one truck position per step. Candidates the packed format can not represent
+        (a drone reconvening twice at the same position, launch cells outside the route) are evaluated one by one.
+
+        Returns (totals, feasible) as NumPy arrays in input order, with the same values as calculate_total_waiting_time.
+        With a bound, feasible candidates above it get an objective of inf, as in the scalar evaluator.
+        """
+        K = len(solutions)
+        totals = np.zeros(K)
+        feasible = np.ones(K, dtype=bool)
+        if K == 0:
+            return totals, feasible
+
+        # Truck routes padded with the depot
+        route_lists = [list(solution["part1"]) for solution in solutions]
+        lengths = np.array([len(route) for route in route_lists], dtype=np.int64)
+        N = int(lengths.max())
+        routes = np.array([route + [0] * (N - len(route)) for route in route_lists], dtype=np.int64)
+
+        # Flatten part2/part3/part4 of all candidates and decode the flights in one go
+        def concatenated(key):
+            values = []
+            sizes = []
+            for solution in solutions:
+                values.extend(solution[key])
+                sizes.append(len(solution[key]))
+            return np.array(values, dtype=np.int64), np.repeat(np.arange(K), sizes), np.cumsum([0] + sizes[:-1])
+
+        part2, owner2, starts2 = concatenated("part2")
+        part3, owner3, _ = concatenated("part3")
+        part4, owner4, _ = concatenated("part4")
+
+        # Drone index of every part2 entry = separators seen before it within its own candidate
+        separator = part2 == -1
+        separators_before = np.concatenate(([0], np.cumsum(separator)))
+        drone = separators_before[:-1] - separators_before[starts2][owner2]
+        U = int(np.bincount(owner2[separator], minlength=K).max()) + 1 if separator.any() else 1
+
+        cust = part2[~separator]
+        owner = owner2[~separator]
+        drone = drone[~separator]
+        launch_idx = part3[part3 != -1] - 1
+        return_idx = part4[part4 != -1] - 1
+        owner3 = owner3[part3 != -1]
+        owner4 = owner4[part4 != -1]
+
+        # Candidates the packed format can not represent go through the scalar evaluator
+        irregular = np.zeros(K, dtype=bool)
+        n_flights = np.bincount(owner, minlength=K)
+        if not (np.array_equal(n_flights, np.bincount(owner3, minlength=K))
+                and np.array_equal(n_flights, np.bincount(owner4, minlength=K))):
+            irregular[:] = True
+        else:
+            reached = (return_idx >= 1) & (return_idx < lengths[owner])
+            cust, owner, drone = cust[reached], owner[reached], drone[reached]
+            launch_idx, return_idx = launch_idx[reached], return_idx[reached]
+            irregular[owner[(launch_idx < 0) | (launch_idx >= lengths[owner])]] = True
+            key = (owner * N + return_idx) * U + drone
+            unique_keys, counts = np.unique(key, return_counts=True)
+            irregular[unique_keys[counts > 1] // (N * U)] = True
+
+        for k in np.flatnonzero(irregular):
+            total, _, _, feas = self.calculate_total_waiting_time(solutions[k], bound)
+            totals[k] = total
+            feasible[k] = feas
+        if irregular.all():
+            return totals, feasible
+
+        keep = ~irregular[owner]
+        ret_cust = np.full((N, U, K), -1, dtype=np.int64)
+        ret_launch = np.zeros((N, U, K), dtype=np.int64)
+        ret_cust[return_idx[keep], drone[keep], owner[keep]] = cust[keep]
+        ret_launch[return_idx[keep], drone[keep], owner[keep]] = launch_idx[keep]
+
+        truck_times = np.asarray(self.truck_times, dtype=float)
+        drone_times = np.asarray(self.drone_times, dtype=float)
+        flight_range = self.flight_range
+        depot_index = self.depot_index
+        rows = np.arange(K)
+
+        t_arrival = np.zeros((K, N))
+        departure = np.zeros(K)
+        availability = np.zeros((U, K))
+        total_time = np.zeros(K)
+        alive = ~irregular
+
+        for i in range(1, N):
+            active = alive & (i < lengths)
+            if not active.any():
+                break
+            curr_node = routes[:, i]
+            truck_arrival = departure + truck_times[routes[:, i - 1], curr_node]
+            t_arrival[:, i] = truck_arrival
+
+            latest_drone = np.full(K, -np.inf)
+            for u in range(U):
+                cust = ret_cust[i, u]
+                has = active & (cust >= 0)
+                if not has.any():
+                    continue
+                cust = np.where(has, cust, 0)
+                launch_idx = ret_launch[i, u]
+                launch_node = routes[rows, launch_idx]
+                flight_out = drone_times[launch_node, cust]
+                total_flight = flight_out + drone_times[cust, curr_node]
+                possible_launch_time = np.where(launch_node != 0, t_arrival[rows, launch_idx], 0)
+                actual_launch_time = np.maximum(possible_launch_time, availability[u])
+
+                drone_return_time = actual_launch_time + total_flight
+                availability[u] = np.where(has, drone_return_time, availability[u])
+                latest_drone = np.where(has, np.maximum(latest_drone, drone_return_time), latest_drone)
+                total_time = np.where(has, total_time + (actual_launch_time + flight_out), total_time)
+
+                drone_wait = np.where(curr_node != 0, np.maximum(truck_arrival - drone_return_time, 0), 0)
+                failed = has & (total_flight + drone_wait > flight_range)
+                if failed.any():
+                    alive &= ~failed
+                    active &= ~failed
+
+            departure = np.where(active, np.maximum(truck_arrival, latest_drone), departure)
+            total_time = np.where(active & (curr_node != depot_index), total_time + truck_arrival, total_time)
+
+        # Feasible totals are scaled like the scalar evaluator; infeasible ones keep their partial sum
+        packed = ~irregular
+        totals[packed] = np.where(alive, total_time / 100.0, total_time)[packed]
+        feasible[packed] = alive[packed]
+        if bound is not None:
+            totals[feasible & (totals > bound)] = np.inf
+        return totals, feasible
@@ -1,11 +1,21 @@
 import numpy as np
+import math
 import json
+import os
+import threading
+import hashlib
+import glob
+import atexit
+import time
 
 n_drones = 2 #fixed
 drone_capacity = 1 #fixed
 depot_index=0 #fixed
 
 def copy_solution(solution: dict):
+    if not isinstance(solution, dict):
+        #CompactSolution copies its own buffers
+        return solution.copy()
     solution_copy = solution.copy()
     solution_copy["part1"] = solution["part1"][:]
     solution_copy["part2"] = solution["part2"][:]
@@ -45,7 +55,71 @@ def parse_solution(values: str):
         "part4": parse_int_list(parts[3]),
     }
 
+### INSTANCE STORE:
+# read_data parses a Data/*.txt file once per process. The first parse also writes the numbers as .npy sidecars in
+# .instance_cache/ next to the file, named by a hash of the text, so later processes memory-map them instead of
+# parsing; an edited instance gets a new hash and is parsed again. Within a process the result is kept in _instances,
+# so creating runners again (create_new_runner, BlindRandomSearch, ...) does not touch the disk at all.
+# The arrays are mapped copy-on-write: the pages are shared with the file, and a write would stay private.
+
+INSTANCE_CACHE_DIR = ".instance_cache"
+
+# Per process: absolute filename -> read_data result
+_instances = {}
+
+
 def read_data(filename: str):
+    key = os.path.abspath(filename)
+    instance = _instances.get(key)
+    if instance is None:
+        instance = load_instance(filename)
+        _instances[key] = instance
+    return instance
+
+def load_instance(filename: str):
+    #Sidecar files if there are any for the current text, otherwise parse and write them
+    with open(filename, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:16]
+    directory = os.path.join(os.path.dirname(filename) or ".", INSTANCE_CACHE_DIR)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    prefix = os.path.join(directory, stem + "." + digest)
+
+    try:
+        # The header goes last when writing, so once it is there the matrices are complete
+        n_customers, flight_range = (int(x) for x in np.load(prefix + ".header.npy"))
+        truck_times = np.asarray(np.load(prefix + ".truck.npy", mmap_mode="c"))
+        drone_times = np.asarray(np.load(prefix + ".drone.npy", mmap_mode="c"))
+        return n_customers + 1, n_customers, n_drones, flight_range, truck_times, drone_times, flight_range, drone_capacity
+    except (FileNotFoundError, ValueError):
+        pass
+
+    instance = parse_data(filename)
+    n_nodes, n_customers, _, flight_range, truck_times, drone_times, _, _ = instance
+    try:
+        os.makedirs(directory, exist_ok=True)
+        for old in glob.glob(os.path.join(directory, stem + ".*.npy")):
+            if not old.startswith(prefix + "."):
+                os.unlink(old)
+        for suffix, array in ((".truck.npy", truck_times), (".drone.npy", drone_times),
+                              (".header.npy", np.array([n_customers, flight_range], dtype=np.int64))):
+            save_npy_atomic(prefix + suffix, array)
+    except OSError as e:
+        # A read-only Data directory only costs the parse next time
+        print("Could not write instance cache for", filename, ":", e)
+    return instance
+
+def save_npy_atomic(path: str, array):
+    tmp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+    try:
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def parse_data(filename: str):
     truck_times = []
     drone_times = []
     hash_count=0
@@ -71,43 +145,208 @@ def read_data(filename: str):
 
     return n_nodes, n_customers, n_drones, flight_range, truck_times, drone_times, flight_range,  drone_capacity
 
+### SOLUTION FILES:
+# save_to_file only decides what changed and hands it to SOLUTION_WRITER, a background thread, so the SA loops never
+# wait for the disk. Updates for an instance coalesce until the writer gets to them (at most one flush per
+# WRITE_INTERVAL seconds): only the latest _current/_best/_final state of a run is written.
+# Every file is written to a temporary file and renamed over the old one, so a crash leaves the previous version.
+# _best.json also stores its objective, and is only replaced by a better one: the check and the rename happen under a
+# file lock (where fcntl exists), so processes searching the same instance cannot overwrite a better best.
+# flush_saves() runs at exit, but pool workers exit without running atexit handlers, so drivers call it at the end.
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+WRITE_INTERVAL = 1.0
+
+
+def solution_parts(solution):
+    return {
+        "part1" : solution["part1"],
+        "part2" : solution["part2"],
+        "part3" : solution["part3"],
+        "part4" : solution["part4"],
+        }
+
 def save_to_file(filename: str, solution, objective, this_run_best_objective, all_time_best_objective):
+    """
+    Queue the solution files of a run. Returns the updated (this_run_best_objective, all_time_best_objective),
+    which the caller passes in again next time, so only improvements are written.
+    """
+    update = {"final": objective}
 
     #Best this run:
     if objective < this_run_best_objective:
-        with open("solutions/" + filename[5:-4] + "_current.json", "w") as current:
-            json.dump({
-                "part1" : solution["part1"],
-                "part2" : solution["part2"],
-                "part3" : solution["part3"],
-                "part4" : solution["part4"],
-                }, current)
+        update["current"] = solution_parts(copy_solution(solution))
         this_run_best_objective = objective
 
     #New all time best
     if objective < all_time_best_objective:
         print("NEW ALL TIME BEST!")
-        with open("solutions/" + filename[5:-4] + "_best.json", "w") as best:
-            json.dump({
-                "part1" : solution["part1"],
-                "part2" : solution["part2"],
-                "part3" : solution["part3"],
-                "part4" : solution["part4"],
-                }, best)
+        update["best"] = (solution_parts(copy_solution(solution)), objective)
         all_time_best_objective = objective
         print(all_time_best_objective)
 
+    SOLUTION_WRITER.submit(filename, update)
+    return this_run_best_objective, all_time_best_objective
+
+def flush_saves():
+    #Blocks until every queued solution file is written. Returns the (filename, error) of the writes that failed.
+    return SOLUTION_WRITER.flush()
+
+
+class SolutionWriter:
+    """Writes the queued solution files on a daemon thread, started on first use."""
+
+    def __init__(self, interval=WRITE_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.idle = threading.Condition(self.lock)
+        # filename -> latest {"current": parts, "best": (parts, objective), "final": objective} not written yet
+        self.pending = {}
+        self.writing = False
+        self.flushing = False
+        self.thread = None
+        self.submitted = 0
+        self.flushes = 0
+        # (filename, error) of the failed writes since the last flush(), and their count over the writer's life
+        self.errors = []
+        self.failures = 0
+
+    def submit(self, filename, update):
+        with self.lock:
+            self.pending.setdefault(filename, {}).update(update)
+            self.submitted += 1
+            self.start()
+            self.wake.notify()
+
+    def start(self):
+        #Called with the lock held
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, name="SolutionWriter", daemon=True)
+            self.thread.start()
+
+    def flush(self):
+        #Returns the (filename, error) of the writes that failed since the last flush
+        with self.lock:
+            self.flushing = True
+            if self.pending:
+                self.start()
+            self.wake.notify()
+            while self.pending or self.writing:
+                self.idle.wait()
+            self.flushing = False
+            errors, self.errors = self.errors, []
+            return errors
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.pending:
+                    self.wake.wait()
+                batch, self.pending = self.pending, {}
+                self.writing = True
+            try:
+                for filename, update in batch.items():
+                    try:
+                        write_solution_files(filename, update)
+                    except Exception as e:
+                        # Not only OSError: anything escaping here would end the thread
+                        print("Could not save solutions for", filename, ":", repr(e))
+                        with self.lock:
+                            self.errors.append((filename, e))
+                            self.failures += 1
+            finally:
+                # Even if the thread dies, flush() must not wait for it
+                with self.lock:
+                    self.writing = False
+                    self.flushes += 1
+                    self.idle.notify_all()
+            with self.lock:
+                # Throttle: what arrives meanwhile is merged into one flush, unless someone is waiting for it
+                deadline = time.monotonic() + self.interval
+                while not self.flushing and time.monotonic() < deadline:
+                    self.wake.wait(deadline - time.monotonic())
+
+    def stats(self):
+        with self.lock:
+            return {"submitted": self.submitted, "flushes": self.flushes, "pending": len(self.pending),
+                    "failures": self.failures}
+
+
+def write_solution_files(filename: str, update):
+    prefix = "solutions/" + filename[5:-4]
+    if "current" in update:
+        write_json_atomic(prefix + "_current.json", update["current"])
+    if "best" in update:
+        save_best(filename, *update["best"])
+    write_json_atomic(prefix + "_final.json", {"objective" : update["final"]})
+
+def write_json_atomic(path: str, data):
+    #Written to a temporary file next to path and renamed over it, so a reader never sees a half-written file
+    tmp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, default=json_scalar)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def json_scalar(value):
+    #NumPy integers/floats (e.g. from the Split labels) are written as the plain numbers they hold
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("Object of type %s is not JSON serializable" % type(value).__name__)
+
+def save_best(filename: str, solution, objective=None):
+    """
+    Atomic replacement of the all time best. With objective, it is stored in the file too, and a stored best
+    that is at least as good is kept. Returns whether the file was replaced.
+    """
+    path = "solutions/" + filename[5:-4] + "_best.json"
+    with open(path + ".lock", "a") as lock:
+        if FCNTL_AVAILABLE:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        if objective is not None:
+            stored = load_best_objective(filename)
+            if stored is not None and stored <= objective:
+                return False
+        data = solution_parts(solution)
+        if objective is not None:
+            data["objective"] = objective
+        write_json_atomic(path, data)
+    return True
 
-    with open("solutions/" + filename[5:-4] + "_final.json", "w") as current_obj:
-        json.dump({
-            "objective" : objective
-        }, current_obj)
-            
 def load_best(filename: str):
     path = "solutions/" + filename[5:-4] + "_best.json"
     try:
         with open(path, "r") as f:
-            return json.load(f)
+            return solution_parts(json.load(f))
     except FileNotFoundError:
         return None  # no best yet
-    
\ No newline at end of file
+
+def load_best_objective(filename: str):
+    #Objective stored with the all time best, None if there is none (or it predates storing it)
+    path = "solutions/" + filename[5:-4] + "_best.json"
+    try:
+        with open(path, "r") as f:
+            return json.load(f).get("objective")
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+SOLUTION_WRITER = SolutionWriter()
+atexit.register(flush_saves)
+
+def acceptance_bound(incumbent_objective, t, rand):
+    #SA accepts a candidate when rand < exp(-delta_e/t), i.e. when its objective is below incumbent + t*ln(1/rand).
+    #Drawing rand before the move gives the operators a bound above which a candidate would be rejected anyway.
+    if rand <= 0:
+        return float('inf')
+    return incumbent_objective + t * math.log(1 / rand)
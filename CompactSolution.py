@@ -0,0 +1,128 @@
+from array import array
+from Common import parse_solution
+
+
+### COMPACT SOLUTION:
+# Array-backed serialization format of a solution, for passing solutions between processes (BatchSa) and storing them.
+# The truck route and every drone's sorties are kept in separate array('i') buffers with no -1 separators, so a
+# solution pickles as a few byte buffers and a copy is a handful of buffer copies instead of rebuilding four lists.
+#
+# The search itself works on the {"part1".."part4"} dict: the operators edit its lists in place, so a CompactSolution
+# is converted with to_dict() before an operator gets it, and back with from_dict() when it is sent on.
+# Indexing with "part1".."part4" (and .get) returns the usual lists with -1 separators, and the evaluator and the
+# feasibility checker read the per-drone arrays directly, so read-only code accepts both formats as they are.
+
+
+class CompactSolution:
+    __slots__ = ("truck", "customers", "launches", "reconvenes")
+
+    def __init__(self, truck, customers, launches, reconvenes):
+        #truck: part1. customers/launches/reconvenes: one array per drone, cells 1-based like part3/part4.
+        self.truck = array('i', truck)
+        self.customers = [array('i', x) for x in customers]
+        self.launches = [array('i', x) for x in launches]
+        self.reconvenes = [array('i', x) for x in reconvenes]
+
+    @property
+    def n_drones(self):
+        return len(self.customers)
+
+    # ----------------------------------------------------------------------
+    # Conversion to and from the dict and string formats
+    # ----------------------------------------------------------------------
+    @classmethod
+    def from_dict(cls, solution):
+        """
+        Build from a {"part1".."part4"} dict. Sorties are assigned to drones by the -1 separators of part2;
+        part3/part4 may carry the same separators or none at all (as the feasibility checker allows).
+        """
+        customers = [[]]
+        for c in solution["part2"]:
+            if c == -1:
+                customers.append([])
+            else:
+                customers[-1].append(c)
+
+        part3_clean = [x for x in solution["part3"] if x != -1]
+        part4_clean = [x for x in solution["part4"] if x != -1]
+        if len(part3_clean) != sum(len(c) for c in customers) or len(part4_clean) != len(part3_clean):
+            raise ValueError("part3/part4 do not have one launch/reconvene cell per customer in part2")
+
+        launches = []
+        reconvenes = []
+        k = 0
+        for drone_customers in customers:
+            launches.append(part3_clean[k:k + len(drone_customers)])
+            reconvenes.append(part4_clean[k:k + len(drone_customers)])
+            k += len(drone_customers)
+
+        return cls(solution["part1"], customers, launches, reconvenes)
+
+    def to_dict(self):
+        return {
+            "part1": self.truck.tolist(),
+            "part2": self.joined(self.customers),
+            "part3": self.joined(self.launches),
+            "part4": self.joined(self.reconvenes),
+        }
+
+    @classmethod
+    def from_string(cls, values: str):
+        return cls.from_dict(parse_solution(values))
+
+    def to_string(self):
+        #Same layout parse_solution reads: "1,2,3|10,-1,20|5,-1,6|100,-1,200"
+        parts = self.to_dict()
+        return "|".join(",".join(str(x) for x in parts[p]) for p in ("part1", "part2", "part3", "part4"))
+
+    @staticmethod
+    def joined(per_drone):
+        joined = []
+        for d, values in enumerate(per_drone):
+            if d > 0:
+                joined.append(-1)
+            joined.extend(values)
+        return joined
+
+    # ----------------------------------------------------------------------
+    # Dict-style read access and copying
+    # ----------------------------------------------------------------------
+    def __getitem__(self, key):
+        if key == "part1":
+            return self.truck.tolist()
+        if key == "part2":
+            return self.joined(self.customers)
+        if key == "part3":
+            return self.joined(self.launches)
+        if key == "part4":
+            return self.joined(self.reconvenes)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return ["part1", "part2", "part3", "part4"]
+
+    def __eq__(self, other):
+        if isinstance(other, CompactSolution):
+            return (self.truck == other.truck and self.customers == other.customers
+                    and self.launches == other.launches and self.reconvenes == other.reconvenes)
+        if isinstance(other, dict):
+            return all(self[p] == other.get(p) for p in self.keys())
+        return NotImplemented
+
+    def copy(self):
+        new = CompactSolution.__new__(CompactSolution)
+        new.truck = self.truck[:]
+        new.customers = [x[:] for x in self.customers]
+        new.launches = [x[:] for x in self.launches]
+        new.reconvenes = [x[:] for x in self.reconvenes]
+        return new
+
+    def __repr__(self):
+        return "CompactSolution(" + self.to_string() + ")"
+
@@ -1,5 +1,14 @@
 from collections import Counter
 from typing import List, Tuple, Dict, Any
+from CompactSolution import CompactSolution
+
+# Reason codes returned by SolutionFeasibility.validate, one per check of is_solution_feasible
+FEASIBLE = "feasible"
+TRUCK_ROUTE = "truck_route"
+INCOMPLETE = "incomplete"
+INCONSISTENT_PARTS = "inconsistent_parts"
+DRONE_SEQUENCING = "drone_sequencing"
+FLIGHT_RANGE = "flight_range"
 
 
 class SolutionFeasibility:
@@ -27,6 +36,8 @@ class SolutionFeasibility:
         self.depot_index = depot_index
         self.drone_times = drone_times
         self.flight_range = flight_range
+        # Nested lists for validate(); NumPy scalar indexing is slow in a Python loop
+        self.drone_lookup = drone_times.tolist() if hasattr(drone_times, "tolist") else drone_times
 
     # ----------------------------------------------------------------------
     # 1) Truck must start and stop at depot
@@ -196,6 +207,13 @@ class SolutionFeasibility:
         Return trips per drone as lists of (launch_cell, reconvene_cell) tuples.
         Robust to -1 separators in part2 and -1 entries in part3/part4.
         """
+        if isinstance(solution, CompactSolution) and solution.n_drones <= self.n_drones:
+            # Already split per drone, nothing to clean
+            trips_per_drone = [list(zip(l, r)) for l, r in zip(solution.launches, solution.reconvenes)]
+            while len(trips_per_drone) < self.n_drones:
+                trips_per_drone.append([])
+            return trips_per_drone
+
         part2 = solution.get("part2", [])
         part3 = solution.get("part3", [])
         part4 = solution.get("part4", [])
@@ -253,6 +271,12 @@ class SolutionFeasibility:
             n_drones = 2
             -> [[9, 4], [2, 10, 7]]
         """
+        if isinstance(solution, CompactSolution) and solution.n_drones <= self.n_drones:
+            routes = [c.tolist() for c in solution.customers]
+            while len(routes) < self.n_drones:
+                routes.append([])
+            return routes
+
         part2 = solution.get("part2", [])
         routes: List[List[int]] = [[] for _ in range(self.n_drones)]
         drone_idx = 0
@@ -372,16 +396,85 @@ class SolutionFeasibility:
         3) part2/part3/part4 consistent (separators, lengths, valid cells, launch<reconvene).
         4) All drone trips feasible w.r.t. range and sequencing.
         """
-        if not self.is_truck_route_feasible(solution):
-            return False
-
-        if not self.is_complete_solution(solution):
-            return False
+        feasible, _ = self.validate(solution)
+        return feasible
 
-        if not self.are_parts_consistent(solution):
-            return False
-
-        if not self.are_all_drone_trips_feasible(solution):
-            return False
+    # ----------------------------------------------------------------------
+    # 6) Fused check: the same conditions as 1)-4) with one decode of the solution
+    # ----------------------------------------------------------------------
+    def validate(self, solution: Dict[str, Any]) -> Tuple[bool, str]:
+        """
+        Single-pass version of is_solution_feasible. Returns (feasible, reason), where reason is FEASIBLE or
+        the code of the first failing check, in the order is_solution_feasible used to run them:
+        TRUCK_ROUTE, INCOMPLETE, INCONSISTENT_PARTS, then DRONE_SEQUENCING / FLIGHT_RANGE.
+        """
+        part1 = solution.get("part1", [])
+        part2 = solution.get("part2", [])
+        part3 = solution.get("part3", [])
+        part4 = solution.get("part4", [])
+        depot = self.depot_index
+        n_nodes = self.n_nodes
+        n = len(part1)
 
-        return True
+        # 1) Truck route, counting truck customers on the way
+        if n < 2 or part1[0] != depot or part1[-1] != depot:
+            return False, TRUCK_ROUTE
+        count = [0] * n_nodes
+        for node in part1[1:-1]:
+            if not (0 <= node < n_nodes) or node == depot:
+                return False, TRUCK_ROUTE
+            count[node] += 1
+        if not (0 <= depot < n_nodes):
+            return False, TRUCK_ROUTE
+
+        # 2) Completeness: every customer exactly once across truck and drones
+        sep2 = part2.count(-1)
+        sep3 = part3.count(-1)
+        sep4 = part4.count(-1)
+        if sep2 > self.n_drones - 1 or sep3 > self.n_drones - 1 or sep4 > self.n_drones - 1:
+            return False, INCOMPLETE
+        for c in part2:
+            if c == -1:
+                continue
+            if not (0 < c < n_nodes) or c == depot:
+                return False, INCOMPLETE
+            count[c] += 1
+        for c in range(1, n_nodes):
+            if count[c] != 1:
+                return False, INCOMPLETE
+
+        # 3) Structure of part2/3/4, with the trip checks of 4) in the same pass.
+        # Once the parts are consistent, the k-th sortie of part2 lines up with the k-th entry of part3/part4.
+        n_sorties = len(part2) - sep2
+        if len(part3) != len(part4) or len(part3) - sep3 != n_sorties or len(part4) - sep4 != n_sorties:
+            return False, INCONSISTENT_PARTS
+        if (sep3 > 0 and sep3 != sep2) or (sep4 > 0 and sep4 != sep2):
+            return False, INCONSISTENT_PARTS
+
+        drone_times = self.drone_lookup
+        flight_range = self.flight_range
+        sequencing_ok = True
+        range_ok = True
+        previous_reconvene = None
+        for launch_cell, cust, reconvene_cell in zip(part3, part2, part4):
+            if cust == -1 and launch_cell == -1 and reconvene_cell == -1:
+                # Next drone
+                previous_reconvene = None
+                continue
+            if launch_cell == -1 or reconvene_cell == -1 or cust == -1:
+                return False, INCONSISTENT_PARTS
+            if not (1 <= launch_cell < reconvene_cell <= n):
+                return False, INCONSISTENT_PARTS
+
+            # 4) Sequencing within the drone and flight range, reported once the whole structure has been checked
+            if previous_reconvene is not None and launch_cell < previous_reconvene:
+                sequencing_ok = False
+            if range_ok and drone_times[part1[launch_cell - 1]][cust] + drone_times[cust][part1[reconvene_cell - 1]] > flight_range:
+                range_ok = False
+            previous_reconvene = reconvene_cell
+
+        if not sequencing_ok:
+            return False, DRONE_SEQUENCING
+        if not range_ok:
+            return False, FLIGHT_RANGE
+        return True, FEASIBLE
@@ -3,7 +3,7 @@ from Common import copy_solution
 import bisect
 from OneReinsert import best_single_insert_random_select, random_select_candidate
 
-def flatten_section(runner, solution):
+def flatten_section(runner, solution, bound=None):
 
     max_drones_flattened = ((len(solution["part2"])-1) // 3)
 
@@ -11,7 +11,7 @@ def flatten_section(runner, solution):
     drone_customers = solution["part2"].copy()
     drone_customers.remove(-1)
     if len(drone_customers) == 0:
-        cost, arr, dep, feas = runner.calculate_total_waiting_time(solution)
+        cost, feas = runner.evaluate_cached(solution)
         return solution, cost
     
     drones_to_flatten = random.sample(drone_customers , nr_drones_flatten)
@@ -30,7 +30,7 @@ def flatten_section(runner, solution):
         candidate["part3"].pop(index_pos)
         candidate["part4"].pop(index_pos)
     try:
-        cost, arr, dep, feas = runner.calculate_total_waiting_time(candidate)
+        cost, feas = runner.evaluate_cached(candidate, bound)
     except:
         print(candidate)
 
@@ -38,7 +38,7 @@ def flatten_section(runner, solution):
         return candidate, cost
     else:
 
-        cost, arr, dep, feas = runner.calculate_total_waiting_time(solution)
+        cost, feas = runner.evaluate_cached(solution)
         return solution, cost 
 
 # runner = 4
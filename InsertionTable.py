@@ -0,0 +1,116 @@
+from Moves import TruckInsert
+
+
+### INSERTION TABLE:
+# Insertion objectives per (node, move) for regret_insert, kept from one insertion round to the next.
+#
+# A committed insertion changes the arrival times after it, so strictly every cached objective goes stale.
+# Entries are therefore reused as marginal costs: an entry scored when the route cost `base` had objective `total`
+# is read back as total - base + current base. Entries in the route region the committed insertion touched are
+# dropped and scored again on the new candidate; all other keys are moved to the cells they have after the insertion.
+# Carried-over values are estimates (a truck insertion upstream can still push a sortie out of flight range through
+# the truck's waiting time), so regret_insert refreshes a node's entries before it commits that node's move.
+#
+# Keys: ("truck", position) for truck insertions, (drone, sender, receiver) for sorties.
+
+
+class InsertionTable:
+    __slots__ = ("runner", "entries", "carried", "candidate", "timing_cache", "base")
+
+    def __init__(self, runner):
+        self.runner = runner
+        # entries[node][key] = (objective, feasible, base objective it was scored against, exact).
+        # exact=False: the scoring was cut short at a limit, and objective is that limit (a lower bound), as in the runner memo.
+        self.entries = {}
+        # Nodes with entries carried over from an earlier round
+        self.carried = set()
+        self.candidate = None
+        self.timing_cache = None
+        self.base = None
+
+    def update(self, candidate):
+        #Start a round on `candidate`, the result of the moves committed so far.
+        self.candidate = candidate
+        self.timing_cache = self.runner.build_timing_cache(candidate)
+        if self.timing_cache["feas"]:
+            self.base = self.timing_cache["end"] / 100.0
+        else:
+            # Without a feasible base there is no marginal cost to carry over
+            self.base = None
+            self.entries.clear()
+            self.carried.clear()
+
+    def refresh(self, node):
+        #Forget node's carried-over entries, so its moves are scored on the current candidate.
+        self.entries.pop(node, None)
+        self.carried.discard(node)
+
+    def score(self, node, key, move, limit=None):
+        #Same result format as move.score: (objective, feasible), inf once the objective passes limit.
+        entries = self.entries.setdefault(node, {})
+        entry = entries.get(key)
+        if entry is not None:
+            total, feas, base, exact = entry
+            if base != self.base:
+                total = total - base + self.base
+            if exact:
+                if limit is not None and feas and total > limit:
+                    return float('inf'), feas
+                return total, feas
+            if limit is not None and total >= limit:
+                return float('inf'), feas
+
+        total, feas = move.score(self.runner, self.candidate, self.timing_cache, limit)
+        if self.base is not None:
+            if total != float('inf'):
+                entries[key] = (total, feas, self.base, True)
+            elif limit is not None and limit != float('inf'):
+                entries[key] = (limit, feas, self.base, False)
+        return total, feas
+
+    def commit(self, node, move):
+        #`move` inserted `node`: drop its entries and the ones the move touched, shift the rest to the new cells.
+        self.entries.pop(node, None)
+        if isinstance(move, TruckInsert):
+            remap = truck_insert_remap(move.position)
+        else:
+            remap = sortie_insert_remap(move.drone, move.sender, move.receiver)
+        for other, entries in self.entries.items():
+            moved = {}
+            for key, entry in entries.items():
+                new_key = remap(key)
+                if new_key is not None:
+                    moved[new_key] = entry
+            self.entries[other] = moved
+        self.carried = {other for other, entries in self.entries.items() if entries}
+
+
+def truck_insert_remap(p):
+    #Mirrors TruckInsert.apply: positions after p and cells >= p move one step back.
+    def remap(key):
+        if key[0] == "truck":
+            q = key[1]
+            if q == p:
+                # The gap was split by the new node
+                return None
+            return ("truck", q + 1) if q > p else key
+        drone, sender, receiver = key
+        if sender <= p <= receiver:
+            # The truck leg the sortie spans (or its launch point) changed
+            return None
+        if sender >= p:
+            return (drone, sender + 1, receiver + 1)
+        return key
+    return remap
+
+
+def sortie_insert_remap(drone, sender, receiver):
+    #A sortie leaves part1 and the cells alone. Touched: moves inside the truck leg it spans or overlapping it,
+    #and every sortie of the same drone, since the drone's later launches wait for its return.
+    def remap(key):
+        if key[0] == "truck":
+            return None if sender <= key[1] <= receiver else key
+        if key[0] == drone or (key[1] < receiver and sender < key[2]):
+            return None
+        return key
+    return remap
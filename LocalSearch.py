@@ -1,7 +1,12 @@
 import copy
 from OneReinsert import one_reinsert
 from Common import copy_solution
-def local_search(runner, iterations):
+from TimeBudget import TimeBudget, budget_steps
+
+def local_search(runner, iterations, time_limit=None):
+    #With time_limit (seconds): run until that deadline, iterations is only an upper limit then (None for none)
+    budget = TimeBudget(time_limit) if time_limit is not None else None
+    iterations_done = 0
 
     result = runner.run()
     if result["feasible"]:
@@ -12,7 +17,8 @@ def local_search(runner, iterations):
         print("ERROR- Initial result is not feasible")
     
 
-    for i in range(iterations):
+    for i in budget_steps(iterations, budget):
+        iterations_done = i + 1
         if (i % 100 == 0):
             print()
             print("Iteration", i)
@@ -21,17 +27,19 @@ def local_search(runner, iterations):
         early_stop_counter += 1
         if early_stop_counter > 10000:
             print("early_stop")
-            return best_solution
+            break
         
         candidate_solution = copy_solution(best_solution)
 
-        candidate_solution, candidate_objective = one_reinsert(runner, candidate_solution)
+        #Only an improvement is kept, so the best objective bounds the evaluation.
+        candidate_solution, candidate_objective = one_reinsert(runner, candidate_solution, best_objective)
         if not candidate_solution:
             print("No new insertions were found, continuing to next iteration.")
             continue
 
         
-        if (candidate_objective < best_objective) and (runner.is_solution_feasible(candidate_solution)):
+        candidate_objective, candidate_feasible, _ = runner.evaluate_solution(candidate_solution, best_objective)
+        if (candidate_objective < best_objective) and candidate_feasible:
             best_solution = copy_solution(candidate_solution)
             best_objective = candidate_objective
             early_stop_counter = 0
@@ -41,4 +49,6 @@ def local_search(runner, iterations):
             print(best_solution)
             print(best_objective)
 
+    if budget is not None:
+        budget.report(iterations_done)
     return best_solution
\ No newline at end of file
@@ -0,0 +1,118 @@
+from bisect import bisect_left
+from Common import copy_solution
+
+
+### MOVES:
+# Lightweight descriptions of the insertions the reinsert operators try.
+# Operators score moves against the unchanged solution (through the timing cache when there is one) and only
+# the move that is finally picked is turned into a solution. apply/undo edit the part lists in place,
+# so a move can also be tried on the working solution and taken back without copying it.
+
+
+class TruckInsert:
+    """Insert `node` into part1 at index `position`; launch/reconvene cells from there on move one step back."""
+    __slots__ = ("node", "position")
+
+    def __init__(self, node, position):
+        self.node = node
+        self.position = position
+
+    def apply(self, solution):
+        position = self.position
+        solution["part1"].insert(position, self.node)
+        for part in (solution["part3"], solution["part4"]):
+            for k, x in enumerate(part):
+                if x >= position:
+                    part[k] = x + 1
+        return solution
+
+    def undo(self, solution):
+        # Every cell >= position was moved past it, so nothing points at the inserted node itself
+        position = self.position
+        solution["part1"].pop(position)
+        for part in (solution["part3"], solution["part4"]):
+            for k, x in enumerate(part):
+                if x > position:
+                    part[k] = x - 1
+        return solution
+
+    def score(self, runner, solution, cache=None, bound=None):
+        if cache is not None:
+            return runner.evaluate_truck_insert(cache, self.node, self.position, bound)
+        return score_in_place(self, runner, solution, bound)
+
+    def applied_to(self, solution):
+        return self.apply(copy_solution(solution))
+
+    def rehash(self, zobrist, solution, h, sorties_at):
+        #Hash of the solution after apply, from its hash h. sorties_at: Tabu.sorties_by_cell(solution).
+        part1 = solution["part1"]
+        position = self.position
+        prev = part1[position - 1]
+        h = zobrist.truck_insert(h, prev, self.node, part1[position])
+        # A cell equal to position is moved onto the inserted node by apply, so those sorties change endpoint
+        for drone, customer, sender, receiver in sorties_at.get(position, ()):
+            launch = part1[sender - 1]
+            reconvene = part1[receiver - 1]
+            h = zobrist.sortie(h, drone, customer, launch, reconvene)
+            h = zobrist.sortie(h, drone, customer, self.node if sender == position else launch,
+                               self.node if receiver == position else reconvene)
+        return h
+
+
+class SortieInsert:
+    """
+    Add a sortie serving `node` to `drone`, launched at cell `sender` and reconvening at cell `receiver` (1-based).
+    The sortie is placed in launch order within the drone's segment of part2/part3/part4.
+    """
+    __slots__ = ("node", "sender", "receiver", "drone", "index")
+
+    def __init__(self, node, sender, receiver, drone):
+        self.node = node
+        self.sender = sender
+        self.receiver = receiver
+        self.drone = drone
+        self.index = None
+
+    def apply(self, solution):
+        part2, part3, part4 = solution["part2"], solution["part3"], solution["part4"]
+        divider_index = part2.index(-1)
+        if self.drone == 0:
+            start, end = 0, divider_index
+        else:
+            start, end = divider_index + 1, len(part2)
+        index = bisect_left(part3, self.sender, start, end)
+        part2.insert(index, self.node)
+        part3.insert(index, self.sender)
+        part4.insert(index, self.receiver)
+        self.index = index
+        return solution
+
+    def undo(self, solution):
+        index = self.index
+        solution["part2"].pop(index)
+        solution["part3"].pop(index)
+        solution["part4"].pop(index)
+        self.index = None
+        return solution
+
+    def score(self, runner, solution, cache=None, bound=None):
+        if cache is not None:
+            return runner.evaluate_sortie_insert(cache, self.node, self.sender, self.receiver, self.drone, bound)
+        return score_in_place(self, runner, solution, bound)
+
+    def applied_to(self, solution):
+        return self.apply(copy_solution(solution))
+
+    def rehash(self, zobrist, solution, h, sorties_at=None):
+        #Hash of the solution after apply, from its hash h
+        part1 = solution["part1"]
+        return zobrist.sortie(h, self.drone, self.node, part1[self.sender - 1], part1[self.receiver - 1])
+
+
+def score_in_place(move, runner, solution, bound=None):
+    #Full evaluation of the move on the working solution, which is left as it was.
+    move.apply(solution)
+    total, _, _, feas = runner.calculate_total_waiting_time(solution, bound)
+    move.undo(solution)
+    return total, feas
@@ -0,0 +1,112 @@
+import random
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import Manager
+from Common import copy_solution, load_best, save_best
+from InitialSolution import create_initial_runner
+from Split import create_split_solution
+from AdaptiveSa import adaptive_sa
+
+
+### MULTI SEED:
+# adaptive_sa as several independent seeds per instance, all (instance, seed) jobs in one process pool, so the
+# cores freed by the small instances go to more seeds of the large ones instead of sitting idle.
+#
+# The seeds of an instance share their best through a SharedBest (a manager dict and lock): each seed publishes its
+# best every SHARE_EVERY iterations, and a seed without a new best for RESTART_AFTER iterations continues from the
+# global best if another seed is ahead (see adaptive_sa). The workers never write to solutions/: the coordinator
+# polls the shared bests and replaces _best.json atomically (Common.save_best) whenever one beats the stored best.
+
+SHARE_EVERY = 200
+RESTART_AFTER = 2000
+# Seconds between the coordinator's checks of the shared bests
+POLL_INTERVAL = 5.0
+
+
+class SharedBest:
+    """Best objective and solution of an instance over its seeds, readable and writable from any worker."""
+
+    def __init__(self, manager, every=SHARE_EVERY, restart_after=RESTART_AFTER):
+        self.lock = manager.Lock()
+        self.state = manager.dict(objective=float('inf'), solution=None, seed=None, updates=0)
+        self.every = every
+        # 0 or None: seeds never restart
+        self.restart_after = restart_after
+        self.seed = None
+
+    def publish(self, solution, objective):
+        with self.lock:
+            if objective < self.state["objective"]:
+                self.state.update(objective=objective, solution=copy_solution(solution), seed=self.seed,
+                                  updates=self.state["updates"] + 1)
+
+    def fetch(self):
+        #(objective, solution) of the global best, (inf, None) before the first publish
+        with self.lock:
+            return self.state["objective"], self.state["solution"]
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.state)
+
+
+def run_seed(filename, iterations, seed, start_solution, share, time_limit=None):
+    #Worker: one adaptive_sa run on filename from start_solution. Returns (filename, seed, best solution, objective).
+    random.seed(seed)
+    share.seed = seed
+    runner = create_initial_runner(filename)
+    runner.solution = copy_solution(start_solution)
+    best_solution = adaptive_sa(runner, iterations, filename, share, time_limit)
+    objective, feasible, _ = runner.evaluate_solution(best_solution)
+    return filename, seed, best_solution, objective if feasible else float('inf')
+
+
+def run_multi_seed(filenames, n_seeds, iterations, max_workers=None, restart_after=RESTART_AFTER, time_limit=None):
+    """
+    n_seeds adaptive_sa runs per instance in one pool. Returns {filename: (best solution, objective)} over the
+    seeds, and keeps solutions/<instance>_best.json up to date while they run.
+    time_limit (seconds) is the budget of each seed, counted from when the pool starts it.
+    """
+    persisted = {}
+    starts = {}
+    sizes = {}
+    for filename in filenames:
+        runner = create_initial_runner(filename)
+        sizes[filename] = runner.truck_times.shape[0]
+        stored = load_best(filename)
+        persisted[filename] = runner.evaluate_cached(stored)[0] if stored else float('inf')
+        # The constructor is deterministic, so it runs once here rather than in every seed
+        starts[filename] = create_split_solution(runner)
+
+    with Manager() as manager, ProcessPoolExecutor(max_workers=max_workers) as executor:
+        shares = {filename: SharedBest(manager, restart_after=restart_after) for filename in filenames}
+        # Seeds of the largest instances first, so they are not the ones left running alone at the end
+        jobs = sorted(((filename, seed) for filename in filenames for seed in range(n_seeds)),
+                      key=lambda job: -sizes[job[0]])
+        pending = {executor.submit(run_seed, filename, iterations, seed, starts[filename], shares[filename],
+                                   time_limit)
+                   for filename, seed in jobs}
+
+        results = {}
+        while pending:
+            done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                filename, seed, solution, objective = future.result()
+                print("Seed", seed, "of", filename, "finished:", objective)
+                if objective < results.get(filename, (None, float('inf')))[1]:
+                    results[filename] = (solution, objective)
+            for filename, share in shares.items():
+                state = share.snapshot()
+                if state["objective"] < persisted[filename]:
+                    save_best(filename, state["solution"], state["objective"])
+                    persisted[filename] = state["objective"]
+                    print("NEW ALL TIME BEST!", filename, state["objective"], "(seed", str(state["seed"]) + ")")
+
+        for filename, share in shares.items():
+            state = share.snapshot()
+            # A restarted seed can end on the global best, so this is at least as good as the seeds' own results
+            if state["objective"] < results.get(filename, (None, float('inf')))[1]:
+                results[filename] = (state["solution"], state["objective"])
+            print(filename, "| best over", n_seeds, "seeds:", results[filename][1], "| shared updates:",
+                  state["updates"])
+    return results
+
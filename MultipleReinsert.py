@@ -28,6 +28,9 @@ from itertools import pairwise
 from itertools import groupby
 import copy
 from Common import copy_solution
+from Moves import TruckInsert, SortieInsert
+from Neighbours import Neighbours, nearest_window_positions
+from InsertionTable import InsertionTable
 
 
 def destroy_random_node_delete(runner, solution):
@@ -197,40 +200,43 @@ def insert_to_drone(solution, node, sender, receiver, drone, divider_index):
 
     return solution
 
-def two_best_single_insert(runner, candidate, node):
+def best_single_inserts(runner, candidate, node, count=2, table=None):
+    #Returns the `count` best (objective, move) tuples; the moves are only applied by regret_insert.
+    #table: InsertionTable on candidate, whose entries are used instead of scoring the moves again.
     best_cost = float('inf')
     best_candidate_tuples = []
-    best_truck_insertion = None
     #print("Candidate before insert")
     #print(candidate)
     insert_positions = find_insert_positions(candidate)
+    position = None
+    if runner.neighbours is not None:
+        #Granular lists: only positions next to the node's neighbours
+        position = Neighbours.positions(candidate["part1"])
+        insert_positions["truck"] = runner.neighbours.truck_positions(candidate["part1"], position, node) or insert_positions["truck"]
 
     #First we check truck insertions:
+    #The timing before the insertion point does not change, so each position is scored from the cached prefix
+    #and only the best one is kept. Evaluations stop once they pass the best position so far.
+    if table is not None:
+        score = lambda key, move, limit: table.score(node, key, move, limit)
+    else:
+        timing_cache = runner.build_timing_cache(candidate)
+        score = lambda key, move, limit: move.score(runner, candidate, timing_cache, limit)
+    best_truck_move = None
     for i in insert_positions["truck"]:
-        test_candidate = copy_solution(candidate)
-
-        test_candidate["part1"].insert(i,node)
-        test_candidate["part3"] = [x+1 if (x >= i and x != -1) else x for x in candidate["part3"]]
-        test_candidate["part4"] = [x+1 if (x >= i and x != -1) else x for x in candidate["part4"]]
-        
-        total, arr, dep, feas = runner.calculate_total_waiting_time(test_candidate)
+        move = TruckInsert(node, i)
+        total, feas = score(("truck", i), move, best_cost)
 
         if feas and total < best_cost:
-
-            #selected_candidate = copy_solution(test_candidate)
-            best_truck_insertion = copy_solution(test_candidate)
-            #best_candidates[0] = (total, selected_candidate)
-            #best_candidates.sort(key=lambda x: x[0])
-            best_cost = total.copy()
-            valid_truck_insertion_found = True
-    if best_truck_insertion:
-        best_candidate_tuples.append((best_cost, best_truck_insertion))
+            best_truck_move = move
+            best_cost = total
+    if best_truck_move is not None:
+        best_candidate_tuples.append((best_cost, best_truck_move))
 
 
 
 
     #Then we check drone insertions:
-    divider_index = candidate["part2"].index(-1)
     for drone_index in range(2):
         if drone_index == 0:
             drone = "d1"
@@ -240,19 +246,9 @@ def two_best_single_insert(runner, candidate, node):
         #Subsection contains a tuple for the drones' availability windows.
         for subsection in insert_positions[drone]:
 
-            shortest_paths = []
-            for truck_index in range(subsection[0], subsection[1]):
-                #For this part we use truck_index -1 since we zero-index when refering to the drone-time matrix.
-                path_length = runner.drone_times[node][candidate["part1"][truck_index-1]]
-                #print("Path between node", node, "and node", candidate["part1"][truck_index-1], "is", path_length)
-                #Keep the best 4. This can be tuned.
-                if len(shortest_paths) < 4:
-                    shortest_paths.append((path_length, truck_index))
-                    shortest_paths.sort(key=lambda x: x[0])
-                elif path_length < shortest_paths[-1][0]:
-                    shortest_paths.pop()
-                    shortest_paths.append((path_length, truck_index))
-                    shortest_paths.sort(key=lambda x: x[0])
+            #The 4 cells closest to the node by drone time (truck_index -1 since the drone-time matrix is zero-indexed).
+            #This can be tuned.
+            shortest_paths = nearest_window_positions(runner, candidate["part1"], node, subsection, position)
 
             #We create solutions for each subsection.
             #Solutions are searched best first, but "best" CAN break feasibility. If it doesn't and we find a feasible option, we exit early. we use found as a flag.
@@ -260,16 +256,18 @@ def two_best_single_insert(runner, candidate, node):
             for (sender_path_length, sender_node_index) in shortest_paths:  
                 for (receiver_path_length, receiver_node_index) in shortest_paths:
                     
-                    if receiver_node_index > sender_node_index:
-                        test_candidate = copy_solution(candidate)
-                        test_candidate = insert_to_drone(test_candidate, node, sender_node_index, receiver_node_index, drone_index, divider_index)
-                        total, arr, dep, feas = runner.calculate_total_waiting_time(test_candidate)
+                    #Pairs out of flight range could only come back infeasible, so they are not scored.
+                    if receiver_node_index > sender_node_index and runner.sortie_range.fits(
+                            candidate["part1"][sender_node_index-1], node, candidate["part1"][receiver_node_index-1]):
+                        #Only the sortie's reconvene point onwards is re-simulated.
+                        #With all slots taken a pair has to match the worst one.
+                        limit = best_candidate_tuples[-1][0] if len(best_candidate_tuples) == count else None
+                        move = SortieInsert(node, sender_node_index, receiver_node_index, drone_index)
+                        total, feas = score((drone_index, sender_node_index, receiver_node_index), move, limit)
                         
                         if feas:
-                            if len(best_candidate_tuples) < 2:
-                                selected_candidate = copy_solution(test_candidate)
-
-                                best_candidate_tuples.append((total, selected_candidate))
+                            if len(best_candidate_tuples) < count:
+                                best_candidate_tuples.append((total, move))
                                 best_candidate_tuples.sort(key=lambda x: x[0])
                                 found = True
                                 break
@@ -277,9 +275,7 @@ def two_best_single_insert(runner, candidate, node):
                             else:
                                 if total <= best_candidate_tuples[-1][0]:
                                     best_candidate_tuples.pop()
-                                    selected_candidate = copy_solution(test_candidate)
-
-                                    best_candidate_tuples.append((total, selected_candidate))
+                                    best_candidate_tuples.append((total, move))
                                     best_candidate_tuples.sort(key=lambda x: x[0])
                                     found = True
                                     break
@@ -288,7 +284,8 @@ def two_best_single_insert(runner, candidate, node):
     
     return best_candidate_tuples
 
-def x_destroy_regret_reinsert(runner, solution=None):
+def x_destroy_regret_reinsert(runner, solution=None, bound=None):
+    #bound only applies to the repaired candidate: the regret values need the unbounded insertion costs.
 
     x = random.randint(1,3)
     
@@ -307,54 +304,57 @@ def x_destroy_regret_reinsert(runner, solution=None):
 
     candidate = regret_insert(runner, candidate, unassigned_list)
     
-    objective, _, _, feas = runner.calculate_total_waiting_time(candidate)
+    objective, feas = runner.evaluate_cached(candidate, bound)
     if feas:
         return candidate, objective
     else:
-        objective, _, _, feas = runner.calculate_total_waiting_time(solution)
+        objective, feas = runner.evaluate_cached(solution)
         return solution , objective
 
-def regret_insert(runner, candidate, unassigned_list):
-    candidates = []
-    diffs = []
-    for orphan in unassigned_list:
-        candidate_tuples = two_best_single_insert(runner, candidate, orphan)
-        if len(candidate_tuples) < 1:
+def regret_insert(runner, candidate, unassigned_list, k=2):
+    """
+    Regret-k insertion: each round inserts the unassigned node whose best insertion has the largest regret,
+    the summed cost difference to its next k-1 best (k=2: best against second best).
+    A node with only one insertion left goes first; a node with none ends the insertion.
+    Insertion objectives are kept in an InsertionTable between rounds, so after an insertion only the moves
+    in the route region it touched are scored again. The chosen node is always re-scored on the current
+    candidate before its move is applied, and the choice is made again if that changes it.
+    """
+    table = InsertionTable(runner)
+    while len(unassigned_list) > 0:
+        table.update(candidate)
+        candidate_tuples = {}
+        while True:
+            for i, orphan in enumerate(unassigned_list):
+                if i not in candidate_tuples:
+                    candidate_tuples[i] = best_single_inserts(runner, candidate, orphan, k, table)
+            chosen = regret_choice(candidate_tuples, len(unassigned_list))
+            orphan = unassigned_list[chosen]
+            if orphan not in table.carried:
+                break
+            table.refresh(orphan)
+            candidate_tuples[chosen] = best_single_inserts(runner, candidate, orphan, k, table)
+
+        if len(candidate_tuples[chosen]) < 1:
             #print("Returned early. No valid inserts found")
             return candidate
-        elif len(candidate_tuples) < 2:
-            #print("Only one valid insertion: Automatically prioritized")
-            candidate = candidate_tuples[0][1]
-            unassigned_list.remove(orphan)
-            if len(unassigned_list) > 0:
-                candidate = regret_insert(runner, candidate, unassigned_list)
-            return candidate
 
-        else:
-            best_insert_score = candidate_tuples[0][0]
-            second_best_insert = candidate_tuples[1][0]
-            diff = second_best_insert - best_insert_score
-            diffs.append(diff)
-            candidates.append(candidate_tuples[0][1])
-
-    # print("candidates")
-    # print(candidates)
-    # print("regrets")
-    # print(diffs)
-    biggest_regret = diffs.index(max(diffs))
-    # print("biggest regret index")
-    # print(biggest_regret)
-    candidate = candidates[biggest_regret]
-    unassigned_list.pop(biggest_regret)
-    # print("corresponding candidate")
-    # print(candidate)
-    # print(unassigned_list)
-    
-    
-    
+        #Only the chosen move is applied
+        move = candidate_tuples[chosen][0][1]
+        candidate = move.applied_to(candidate)
+        table.commit(unassigned_list.pop(chosen), move)
 
-    if len(unassigned_list) > 0:
-        candidate = regret_insert(runner, candidate, unassigned_list)
     #print("returns successfully")
     return candidate
 
+def regret_choice(candidate_tuples, n_orphans):
+    #Index of the orphan to insert next, given the (objective, move) tuples of each orphan.
+    regrets = []
+    for i in range(n_orphans):
+        tuples = candidate_tuples[i]
+        if len(tuples) < 2:
+            #No insertion (ends the insertion) or only one: automatically prioritized
+            return i
+        best_insert_score = tuples[0][0]
+        regrets.append(sum(x[0] for x in tuples[1:]) - (len(tuples) - 1) * best_insert_score)
+    return regrets.index(max(regrets))
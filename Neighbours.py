@@ -0,0 +1,88 @@
+import heapq
+import numpy as np
+
+
+### NEIGHBOURS:
+# Granular candidate lists: for every node its k nearest nodes by truck time and by drone time, built once per instance.
+# With runner.neighbours set (SolutionRunner(granular_k=k) or runner.set_granular_k(k)) the insertion operators only
+# try truck positions directly before or after one of the node's truck neighbours, and take sortie launch/reconvene
+# points from its drone neighbours instead of scanning the whole availability window.
+# granular_k=None (the default) keeps the exhaustive scan. Benchmark.compare_granular measures the trade-off.
+
+
+class Neighbours:
+    __slots__ = ("k", "truck", "drone")
+
+    def __init__(self, truck_times, drone_times, k):
+        self.k = k
+        truck_times = np.asarray(truck_times, dtype=np.float64)
+        drone_times = np.asarray(drone_times, dtype=np.float64)
+        #The truck enters and leaves the node, so both directions count for asymmetric instances.
+        self.truck = [[j for _, j in row] for row in nearest_nodes(truck_times + truck_times.T, k)]
+        #Same distance the window scan sorts by: drone_times[node][truck node]
+        self.drone = nearest_nodes(drone_times, k)
+
+    def truck_positions(self, part1, position, node):
+        #Insert positions (1..len(part1)-1) right before or after one of node's truck neighbours, in route order.
+        depot = part1[0]
+        last = len(part1) - 1
+        positions = set()
+        for neighbour in self.truck[node]:
+            if neighbour == depot:
+                positions.add(1)
+                positions.add(last)
+                continue
+            p = position.get(neighbour)
+            if p is not None:
+                positions.add(p)
+                positions.add(p + 1)
+        return sorted(positions)
+
+    def window_positions(self, part1, position, node, subsection, count=4):
+        #Up to `count` (drone time, cell) pairs in the window [start, end) whose truck node is a drone neighbour, nearest first.
+        start, end = subsection
+        depot = part1[0]
+        found = []
+        for path_length, neighbour in self.drone[node]:
+            if neighbour == depot:
+                #The depot is both the first and the last cell of the route
+                cells = (1, len(part1))
+            else:
+                p = position.get(neighbour)
+                cells = () if p is None else (p + 1,)
+            for cell in cells:
+                if start <= cell < end:
+                    found.append((path_length, cell))
+            if len(found) >= count:
+                return found[:count]
+        return found
+
+    @staticmethod
+    def positions(part1):
+        #Index of every truck customer in part1 (the depot is handled separately)
+        return {node: i for i, node in enumerate(part1[1:-1], 1)}
+
+
+def nearest_nodes(times, k):
+    #Per row, the k nearest other nodes as (time, node) pairs, nearest first (ties to the lower node id).
+    order = np.argsort(times, axis=1, kind="stable")
+    nearest = []
+    for i, row in enumerate(order.tolist()):
+        nodes = [j for j in row if j != i][:k]
+        nearest.append([(float(times[i, j]), j) for j in nodes])
+    return nearest
+
+
+def nearest_window_positions(runner, part1, node, subsection, position=None):
+    """
+    The 4 cells of a drone availability window whose truck nodes are closest to node by drone time, as
+    (drone time, cell) pairs, nearest first. The exhaustive scan breaks ties towards the earlier cell.
+    With granular lists, only the node's drone neighbours are looked up (position: Neighbours.positions(part1));
+    if fewer than two of them fall in the window, the window is scanned as usual.
+    """
+    if runner.neighbours is not None:
+        found = runner.neighbours.window_positions(part1, position, node, subsection)
+        if len(found) >= 2:
+            return found
+    drone_times = runner.drone_lookup[node]
+    return heapq.nsmallest(4, ((drone_times[part1[i - 1]], i) for i in range(subsection[0], subsection[1])), key=lambda x: x[0])
@@ -0,0 +1,166 @@
+import numpy as np
+
+# Optional compiled backend for calculate_total_waiting_time.
+# Numba is not a hard requirement: without it NUMBA_AVAILABLE is False and the runner keeps the Python evaluator.
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _total_waiting_time(part1, part2, part3, part4, truck_times, drone_times, flight_range, depot_index, limit):
+    """
+    Same simulation as CalCulateTotalArrivalTime.calculate_total_waiting_time, on int64 copies of part1-part4.
+    Returns (total, status, arrival, departure) where status is 1 for feasible, 0 for a broken flight range
+    (total is then the unscaled partial sum, like the Python evaluator) and -1 when the solution can not be
+    evaluated safely without bounds checks. The caller falls back to the Python evaluator in that case.
+    Once the unscaled objective passes `limit` the walk stops with status 2.
+    """
+    n = part1.shape[0]
+    n_matrix = truck_times.shape[0]
+    t_arrival = np.zeros(n)
+    t_departure = np.zeros(n)
+
+    for i in range(n):
+        if part1[i] < 0 or part1[i] >= n_matrix:
+            return 0.0, -1, t_arrival, t_departure
+
+    # k-th customer of part2 pairs with the k-th non-separator cell of part3/part4
+    n_flights = 0
+    n_drone_routes = 1
+    for x in part2:
+        if x == -1:
+            n_drone_routes += 1
+        else:
+            n_flights += 1
+
+    cust = np.empty(n_flights, np.int64)
+    launch = np.empty(n_flights, np.int64)
+    ret = np.empty(n_flights, np.int64)
+    drone = np.empty(n_flights, np.int64)
+    j3 = 0
+    j4 = 0
+    k = 0
+    u = 0
+    for x in part2:
+        if x == -1:
+            u += 1
+            continue
+        while j3 < part3.shape[0] and part3[j3] == -1:
+            j3 += 1
+        while j4 < part4.shape[0] and part4[j4] == -1:
+            j4 += 1
+        if j3 >= part3.shape[0] or j4 >= part4.shape[0] or x < 0 or x >= n_matrix:
+            return 0.0, -1, t_arrival, t_departure
+        cust[k] = x
+        launch[k] = part3[j3] - 1
+        ret[k] = part4[j4] - 1
+        drone[k] = u
+        j3 += 1
+        j4 += 1
+        k += 1
+
+    # Return-indexed trip table; the counting sort keeps part2 order within a position
+    start = np.zeros(n + 1, np.int64)
+    for k in range(n_flights):
+        if 0 < ret[k] < n:
+            if launch[k] < -n or launch[k] >= n:
+                return 0.0, -1, t_arrival, t_departure
+            start[ret[k] + 1] += 1
+    for i in range(n):
+        start[i + 1] += start[i]
+    order = np.empty(start[n], np.int64)
+    fill = start.copy()
+    for k in range(n_flights):
+        if 0 < ret[k] < n:
+            order[fill[ret[k]]] = k
+            fill[ret[k]] += 1
+
+    drone_availability = np.zeros(n_drone_routes)
+    total_time = 0.0
+    for i in range(1, n):
+        curr_node = part1[i]
+        truck_arrival = t_departure[i - 1] + truck_times[part1[i - 1], curr_node]
+        t_arrival[i] = truck_arrival
+
+        has_returns = False
+        latest_drone = 0.0
+        for f in range(start[i], start[i + 1]):
+            k = order[f]
+            c = cust[k]
+            launch_idx = launch[k]
+            if launch_idx < 0:
+                launch_idx += n
+            launch_node = part1[launch_idx]
+            flight_out = drone_times[launch_node, c]
+            total_flight = flight_out + drone_times[c, curr_node]
+
+            possible_launch_time = t_arrival[launch_idx] if launch_node != 0 else 0.0
+            actual_launch_time = max(possible_launch_time, drone_availability[drone[k]])
+
+            drone_return_time = actual_launch_time + total_flight
+            drone_availability[drone[k]] = drone_return_time
+            if not has_returns or drone_return_time > latest_drone:
+                latest_drone = drone_return_time
+                has_returns = True
+            total_time += actual_launch_time + flight_out
+
+            drone_wait = max(truck_arrival - drone_return_time, 0.0) if curr_node != 0 else 0.0
+            if total_flight + drone_wait > flight_range:
+                return total_time, 0, t_arrival, t_departure
+
+        if has_returns:
+            t_departure[i] = max(truck_arrival, latest_drone)
+        else:
+            t_departure[i] = truck_arrival
+
+        if curr_node != depot_index:
+            total_time += truck_arrival
+
+        if total_time > limit:
+            return total_time, 2, t_arrival, t_departure
+
+    return total_time / 100.0, 1, t_arrival, t_departure
+
+
+if NUMBA_AVAILABLE:
+    # Compiled eagerly for the one signature we use and cached next to the module,
+    # so ProcessPool workers load the machine code from disk instead of compiling it again.
+    total_waiting_time_kernel = njit(
+        "Tuple((float64, int64, float64[::1], float64[::1]))"
+        "(int64[::1], int64[::1], int64[::1], int64[::1], float64[:, ::1], float64[:, ::1], float64, int64, float64)",
+        cache=True,
+    )(_total_waiting_time)
+else:
+    total_waiting_time_kernel = None
+
+
+def kernel_matrices(truck_times, drone_times):
+    return (
+        np.ascontiguousarray(truck_times, dtype=np.float64),
+        np.ascontiguousarray(drone_times, dtype=np.float64),
+    )
+
+
+def compiled_total_waiting_time(runner, solution, bound=None):
+    """
+    Evaluate a solution with the compiled kernel. Returns the same tuple as calculate_total_waiting_time,
+    or None when the kernel refuses the solution and the Python evaluator should be used.
+    """
+    total, status, t_arrival, t_departure = total_waiting_time_kernel(
+        np.array(solution["part1"], dtype=np.int64),
+        np.array(solution["part2"], dtype=np.int64),
+        np.array(solution["part3"], dtype=np.int64),
+        np.array(solution["part4"], dtype=np.int64),
+        runner.kernel_truck_times,
+        runner.kernel_drone_times,
+        float(runner.flight_range),
+        runner.depot_index,
+        bound * 100.0 if bound is not None else np.inf,
+    )
+    if status < 0:
+        return None
+    if status == 2 or (bound is not None and status == 1 and total > bound):
+        return float('inf'), t_arrival, t_departure, True
+    return total, t_arrival, t_departure, status == 1
@@ -28,6 +28,9 @@ from itertools import pairwise
 from itertools import groupby
 import copy
 from Common import copy_solution
+from Moves import TruckInsert, SortieInsert
+from Neighbours import Neighbours, nearest_window_positions
+from Tabu import sorties_by_cell
 
 
 def destroy_random_node_delete(runner, solution):
@@ -153,6 +156,14 @@ def find_insert_positions(candidate):
     #print(insert_positions)
     return insert_positions
 
+#Insert customer into the truck route, moving the launch/reconvene cells from the insertion point onwards.
+def insert_to_truck(solution, node, position):
+    solution["part1"].insert(position, node)
+    solution["part3"] = [x+1 if (x >= position and x != -1) else x for x in solution["part3"]]
+    solution["part4"] = [x+1 if (x >= position and x != -1) else x for x in solution["part4"]]
+
+    return solution
+
 #Deconstruct based on divider, and insert customer to part2, as well as correct indexes to part3 and part4.
 def insert_to_drone(solution, node, sender, receiver, drone, divider_index):
 
@@ -197,115 +208,166 @@ def insert_to_drone(solution, node, sender, receiver, drone, divider_index):
 
     return solution
 
-def best_single_insert_random_select(runner, candidate, node):
+def drone_insert_trials(runner, candidate, node, insert_positions, position=None):
+    #Returns the (sender, receiver) pairs to try for each drone availability window, in the order they should be tried.
+    #position: Neighbours.positions(candidate["part1"]) when the runner uses granular lists.
+    trials = []
+    for drone_index in range(2):
+        if drone_index == 0:
+            drone = "d1"
+        else:
+            drone = "d2"
+        
+        #Subsection contains a tuple for the drones' availability windows.
+        for subsection in insert_positions[drone]:
+
+            #The 4 cells closest to the node by drone time (truck_index -1 since the drone-time matrix is zero-indexed).
+            #This can be tuned.
+            shortest_paths = nearest_window_positions(runner, candidate["part1"], node, subsection, position)
+
+            #Solutions are searched best first, but "best" CAN break feasibility.
+            #Pairs out of flight range are dropped here, their evaluation could only come back infeasible.
+            pairs = []
+            for (sender_path_length, sender_node_index) in shortest_paths:  
+                for (receiver_path_length, receiver_node_index) in shortest_paths:
+                    if receiver_node_index > sender_node_index and runner.sortie_range.fits(
+                            candidate["part1"][sender_node_index-1], node, candidate["part1"][receiver_node_index-1]):
+                        pairs.append((sender_node_index, receiver_node_index))
+            trials.append((drone_index, pairs))
+
+    return trials
+
+def batch_insertion_scores(runner, candidate, node, truck_positions, drone_trials, bound=None):
+    #Builds every truck and drone candidate for the node and evaluates them in one batched call.
+    keys = []
+    candidates = []
+    for i in truck_positions:
+        keys.append(("truck", i))
+        candidates.append(TruckInsert(node, i).applied_to(candidate))
+
+    for drone_index, pairs in drone_trials:
+        for sender_node_index, receiver_node_index in pairs:
+            keys.append((drone_index, sender_node_index, receiver_node_index))
+            candidates.append(SortieInsert(node, sender_node_index, receiver_node_index, drone_index).applied_to(candidate))
+
+    totals, feasible = runner.calculate_total_waiting_time_batch(candidates, bound)
+    return {key: (float(total), bool(feas)) for key, total, feas in zip(keys, totals, feasible)}
+
+def best_single_insert_random_select(runner, candidate, node, bound=None, skip_tabu=False):
+    #Returns up to 5 (objective, move) tuples. Nothing is built here, random_select_move turns the chosen move into a solution.
+    #Candidates above bound are never kept, the evaluation stops as soon as it passes the bound.
+    #skip_tabu: the moves complete the solution, so the ones leading to a solution in runner.tabu are dropped unscored.
+    if bound is None:
+        bound = float('inf')
     best_cost = float('inf')
-    best_candidate_tuples = []
-    best_truck_insertion = None
+    best_move_tuples = []
     #print("Candidate before insert")
     #print(candidate)
     insert_positions = find_insert_positions(candidate)
-
-    #First we check truck insertions:
+    position = None
+    if runner.neighbours is not None:
+        #Granular lists: only positions next to the node's neighbours
+        position = Neighbours.positions(candidate["part1"])
+        insert_positions["truck"] = runner.neighbours.truck_positions(candidate["part1"], position, node) or insert_positions["truck"]
+    drone_trials = drone_insert_trials(runner, candidate, node, insert_positions, position)
+
+    if runner.batch_evaluation:
+        #Whole candidate set in one vectorized call
+        scores = batch_insertion_scores(runner, candidate, node, insert_positions["truck"], drone_trials, bound)
+        score_truck = lambda move, limit: scores[("truck", move.position)]
+        score_drone = lambda move, limit: scores[(move.drone, move.sender, move.receiver)]
+    else:
+        #The timing before the insertion point does not change, so each position is scored from the cached prefix.
+        #For a sortie only the reconvene point onwards is re-simulated.
+        timing_cache = runner.build_timing_cache(candidate)
+        score_truck = lambda move, limit: move.score(runner, candidate, timing_cache, limit)
+        score_drone = score_truck
+
+    tabu = runner.tabu if skip_tabu else None
+    if tabu is not None:
+        #Each move's hash follows from the candidate's in O(1), see Tabu.py
+        zobrist = runner.zobrist
+        candidate_hash = zobrist.solution_hash(candidate)
+        sorties_at = sorties_by_cell(candidate)
+
+    #First we check truck insertions, only the best one is kept. A position only matters if it beats the best so far.
+    best_truck_move = None
     for i in insert_positions["truck"]:
-        test_candidate = copy_solution(candidate)
-
-        test_candidate["part1"].insert(i,node)
-        test_candidate["part3"] = [x+1 if (x >= i and x != -1) else x for x in candidate["part3"]]
-        test_candidate["part4"] = [x+1 if (x >= i and x != -1) else x for x in candidate["part4"]]
-        
-        total, arr, dep, feas = runner.calculate_total_waiting_time(test_candidate)
+        move = TruckInsert(node, i)
+        if tabu is not None and tabu.skip_move(move.rehash(zobrist, candidate, candidate_hash, sorties_at)):
+            continue
+        total, feas = score_truck(move, min(bound, best_cost))
 
         if feas and total < best_cost:
-
-            #selected_candidate = copy_solution(test_candidate)
-            best_truck_insertion = copy_solution(test_candidate)
-            #best_candidates[0] = (total, selected_candidate)
-            #best_candidates.sort(key=lambda x: x[0])
-            best_cost = total.copy()
-            valid_truck_insertion_found = True
-    if best_truck_insertion:
-        best_candidate_tuples.append((best_cost, best_truck_insertion))
+            best_truck_move = move
+            best_cost = total
+    if best_truck_move is not None:
+        best_move_tuples.append((best_cost, best_truck_move))
 
 
 
 
     #Then we check drone insertions:
-    divider_index = candidate["part2"].index(-1)
-    for drone_index in range(2):
-        if drone_index == 0:
-            drone = "d1"
-        else:
-            drone = "d2"
-        
-        #Subsection contains a tuple for the drones' availability windows.
-        for subsection in insert_positions[drone]:
-
-            shortest_paths = []
-            for truck_index in range(subsection[0], subsection[1]):
-                #For this part we use truck_index -1 since we zero-index when refering to the drone-time matrix.
-                path_length = runner.drone_times[node][candidate["part1"][truck_index-1]]
-                #print("Path between node", node, "and node", candidate["part1"][truck_index-1], "is", path_length)
-                #Keep the best 4. This can be tuned.
-                if len(shortest_paths) < 4:
-                    shortest_paths.append((path_length, truck_index))
-                    shortest_paths.sort(key=lambda x: x[0])
-                elif path_length < shortest_paths[-1][0]:
-                    shortest_paths.pop()
-                    shortest_paths.append((path_length, truck_index))
-                    shortest_paths.sort(key=lambda x: x[0])
-
-            #We create solutions for each subsection.
-            #Solutions are searched best first, but "best" CAN break feasibility. If it doesn't and we find a feasible option, we exit early. we use found as a flag.
-            found = False
-            for (sender_path_length, sender_node_index) in shortest_paths:  
-                for (receiver_path_length, receiver_node_index) in shortest_paths:
-                    
-                    if receiver_node_index > sender_node_index:
-                        test_candidate = copy_solution(candidate)
-                        test_candidate = insert_to_drone(test_candidate, node, sender_node_index, receiver_node_index, drone_index, divider_index)
-                        total, arr, dep, feas = runner.calculate_total_waiting_time(test_candidate)
-                        
-                        if feas:
-                            if len(best_candidate_tuples) < 5:
-                                selected_candidate = copy_solution(test_candidate)
-
-                                best_candidate_tuples.append((total, selected_candidate))
-                                best_candidate_tuples.sort(key=lambda x: x[0])
-                                found = True
-                                break
-
-                            else:
-                                if total <= best_candidate_tuples[-1][0]:
-                                    best_candidate_tuples.pop()
-                                    selected_candidate = copy_solution(test_candidate)
-
-                                    best_candidate_tuples.append((total, selected_candidate))
-                                    best_candidate_tuples.sort(key=lambda x: x[0])
-                                    found = True
-                                    break
-                if found:
+    #For each subsection we keep the first feasible pair that makes it into the list.
+    #Once the list is full a pair has to match its worst entry.
+    for drone_index, pairs in drone_trials:
+        for sender_node_index, receiver_node_index in pairs:
+            if len(best_move_tuples) < 5:
+                limit = bound
+            else:
+                limit = min(bound, best_move_tuples[-1][0])
+            move = SortieInsert(node, sender_node_index, receiver_node_index, drone_index)
+            if tabu is not None and tabu.skip_move(move.rehash(zobrist, candidate, candidate_hash)):
+                continue
+            total, feas = score_drone(move, limit)
+            
+            if feas and total <= bound:
+                if len(best_move_tuples) < 5:
+                    best_move_tuples.append((total, move))
+                    best_move_tuples.sort(key=lambda x: x[0])
                     break
+
+                else:
+                    if total <= best_move_tuples[-1][0]:
+                        best_move_tuples.pop()
+                        best_move_tuples.append((total, move))
+                        best_move_tuples.sort(key=lambda x: x[0])
+                        break
     
-    return best_candidate_tuples
+    return best_move_tuples
 
 def random_select_candidate(candidates):
     rand_max = len(candidates)
     selected = random.randint(0,rand_max-1)
     return candidates[selected][1], candidates[selected][0]
 
-def one_reinsert(runner, solution=None):
+def random_select_move(candidate, move_tuples, in_place=False):
+    #Same draw as random_select_candidate, but only the selected move is applied.
+    #in_place reuses candidate for the result when the caller does not need it anymore.
+    move, objective = random_select_candidate(move_tuples)
+    if in_place:
+        return move.apply(candidate), objective
+    return move.applied_to(candidate), objective
+
+def one_reinsert(runner, solution=None, bound=None):
+    #bound: optional objective above which the caller would reject the result (e.g. the SA acceptance threshold).
     if not solution:
         solution = runner.solution
     
     candidate, unassigned = destroy_random_node_delete(runner, solution) #Good
-    for node in unassigned:
+    for k, node in enumerate(unassigned):
         #candidate = single_insert(runner, candidate, node)
-        candidate_tuples = best_single_insert_random_select(runner, candidate, node)
-        if len(candidate_tuples) == 0:
-            total, _, _, _ = runner.calculate_total_waiting_time(solution)
+        #Only the last insertion gives the final objective, so only that one is bounded.
+        node_bound = bound if k == len(unassigned) - 1 else None
+        move_tuples = best_single_insert_random_select(runner, candidate, node, node_bound, skip_tabu=(k == len(unassigned) - 1))
+        if len(move_tuples) == 0:
+            total, _ = runner.evaluate_cached(solution)
             return solution, total
         else:
-            candidate, objective = random_select_candidate(candidate_tuples)
+            #candidate is our own copy from destroy_random_node_delete, so the move is applied to it directly
+            candidate, objective = random_select_move(candidate, move_tuples, in_place=True)
             #candidate = weighted_select_candidate(candidates)
 
+    #The objective comes from the delta evaluation, the memo saves the search loop from simulating it again.
+    runner.remember(candidate, objective, True)
     return candidate, objective
\ No newline at end of file
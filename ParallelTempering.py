@@ -0,0 +1,225 @@
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from Common import copy_solution, load_best, save_best, acceptance_bound
+from InitialSolution import create_initial_runner
+from Split import create_split_solution
+from AdaptiveSa import OPERATORS, apply_operator, update_weights
+from TimeBudget import TimeBudget
+
+
+### PARALLEL TEMPERING:
+# Replica exchange instead of one annealed chain: n_chains chains run at fixed temperatures spread geometrically
+# between PT_T_MIN and a hot end, each with its own operator weights (adaptive_sa's avg_delta_e/gradient rule and
+# update_weights). The chains run SWAP_EVERY steps at a time across a process pool; then neighbouring temperatures
+# swap solutions by the Metropolis criterion, accepting with probability min(1, exp((E_cold - E_hot) * (1/T_cold - 1/T_hot))).
+# Even and odd pairs take turns. Good solutions found by the hot chains sink to the cold ones, and a stuck cold chain
+# gets a way out of its basin, without a cooling schedule.
+#
+# The hot end comes from the same rule as adaptive_sa's t_0 (an average worsening move is accepted with
+# probability 0.8), measured on PT_SAMPLES operator moves from the start solution; the cold end is adaptive_sa's t_f.
+#
+# A chain's state (solution, weights, random state, tabu list...) is a dict passed to the worker and back each round,
+# so any process can run any chain; the weights and the tabu list stay with the temperature when solutions swap.
+# Each worker process keeps one runner per instance, whose caches carry over between rounds.
+#
+# With time_limit, rounds go on until the deadline; the chains get it as a wall-clock time (shared between processes)
+# and stop mid-round when it passes. Their staleness window follows the step count the rate so far projects.
+
+SWAP_EVERY = 100
+PT_SAMPLES = 50
+PT_T_MIN = 0.1
+
+# Per process: filename -> runner
+_runners = {}
+
+
+def chain_runner(filename):
+    runner = _runners.get(filename)
+    if runner is None:
+        runner = create_initial_runner(filename)
+        _runners[filename] = runner
+    return runner
+
+
+def temperature_ladder(runner, solution, objective, n_chains):
+    #n_chains temperatures from PT_T_MIN up to the temperature where an average worsening move passes with p=0.8
+    worsening = []
+    for _ in range(PT_SAMPLES):
+        op = random.randrange(len(OPERATORS))
+        candidate, _ = apply_operator(runner, op, solution)
+        if not candidate:
+            continue
+        candidate_objective, feasible, _ = runner.evaluate_solution(candidate)
+        if feasible and candidate_objective > objective:
+            worsening.append(candidate_objective - objective)
+    if worsening:
+        t_max = (sum(worsening) / len(worsening)) / -math.log(0.8)
+    else:
+        t_max = objective / 100
+    t_max = max(t_max, PT_T_MIN)
+    if n_chains == 1:
+        return [t_max]
+    return [PT_T_MIN * (t_max / PT_T_MIN) ** (k / (n_chains - 1)) for k in range(n_chains)]
+
+
+def new_chain(runner, solution, objective, t, seed, staleness_limit):
+    random.seed(seed)
+    return {
+        "t": t,
+        "solution": copy_solution(solution),
+        "objective": objective,
+        "best_solution": copy_solution(solution),
+        "best_objective": objective,
+        "weights": [1.0] * len(OPERATORS),
+        "avg_delta_e": [0] * len(OPERATORS),
+        "basin_obj": [objective],
+        "relative_gradient": 0,
+        "staleness_limit": staleness_limit,
+        "step": 0,
+        "accepted": 0,
+        "rng": random.getstate(),
+        "tabu": runner.start_tabu(solution, objective),
+    }
+
+
+def run_chain(filename, chain, steps, stop_at=None):
+    #Worker: steps SA moves at the chain's fixed temperature, fewer if time.time() passes stop_at. Returns the updated chain.
+    runner = chain_runner(filename)
+    random.setstate(chain["rng"])
+    runner.tabu = chain["tabu"]
+    t = chain["t"]
+    decay = 0.01
+    solution, objective = chain["solution"], chain["objective"]
+    best_solution, best_objective = chain["best_solution"], chain["best_objective"]
+    weights, avg_delta_e = chain["weights"], chain["avg_delta_e"]
+    basin_obj, relative_gradient = chain["basin_obj"], chain["relative_gradient"]
+
+    for _ in range(steps):
+        if stop_at is not None and time.time() >= stop_at:
+            break
+        chain["step"] += 1
+        rand = random.randint(0, 100) / 100
+        bound = acceptance_bound(objective, t, rand)
+
+        op = random.choices(range(len(OPERATORS)), weights=weights)[0]
+        candidate, candidate_objective = apply_operator(runner, op, solution, bound)
+        if not candidate:
+            continue
+
+        #A recent solution is not evaluated again (see Tabu.py) and is not moved to; it counts in the operator statistics
+        candidate_objective, candidate_feasible, skipped = runner.evaluate_candidate(candidate, bound)
+        delta_e = candidate_objective - objective
+
+        if not skipped and candidate_feasible and delta_e < 0:
+            solution, objective = copy_solution(candidate), candidate_objective
+            chain["accepted"] += 1
+            if objective < best_objective:
+                best_solution, best_objective = copy_solution(solution), objective
+        elif not skipped and candidate_feasible and delta_e != 0 and rand < math.exp(-delta_e / t):
+            solution, objective = copy_solution(candidate), candidate_objective
+            chain["accepted"] += 1
+            relative_gradient = (objective - best_objective) / 100
+            basin_obj = []
+
+        basin_obj.insert(0, objective)
+        while len(basin_obj) > chain["staleness_limit"]:
+            basin_obj.pop()
+        gradient = basin_obj[-1] - objective
+
+        #A pruned candidate is at least as bad as the bound
+        if candidate_objective == float('inf'):
+            if bound == float('inf'):
+                continue
+            delta_e = bound - objective
+        avg_delta_e[op] = ((1 - decay) * avg_delta_e[op]) + (decay * delta_e)
+        gradient_normalized = min(1, gradient / relative_gradient) if relative_gradient > 0 else 0
+        weights = update_weights(avg_delta_e, gradient_normalized, len(weights), chain["step"])
+
+    chain.update(solution=solution, objective=objective, best_solution=best_solution, best_objective=best_objective,
+                 weights=weights, basin_obj=basin_obj, relative_gradient=relative_gradient, rng=random.getstate())
+    runner.tabu = None
+    return chain
+
+
+def swap_chains(chains, parity, swaps):
+    #Metropolis swaps between the neighbouring temperatures (parity, parity + 1), (parity + 2, parity + 3), ...
+    for k in range(parity, len(chains) - 1, 2):
+        cold, hot = chains[k], chains[k + 1]
+        swaps[k][0] += 1
+        exponent = (cold["objective"] - hot["objective"]) * (1 / cold["t"] - 1 / hot["t"])
+        if exponent >= 0 or random.random() < math.exp(exponent):
+            swaps[k][1] += 1
+            for key in ("solution", "objective"):
+                cold[key], hot[key] = hot[key], cold[key]
+            # The gradient window belonged to the old trajectory
+            for chain in (cold, hot):
+                chain["basin_obj"] = [chain["objective"]]
+
+
+def parallel_tempering(filename, iterations, n_chains=8, max_workers=None, seed=0, time_limit=None):
+    """
+    Replica exchange on one instance: n_chains chains of `iterations` steps each.
+    Returns the best solution over all chains; solutions/<instance>_best.json is replaced (atomically) when it is beaten.
+    With time_limit (seconds) it stops at that deadline, and iterations is only an upper limit (None for none).
+    """
+    budget = TimeBudget(time_limit) if time_limit is not None else None
+    random.seed(seed)
+    runner = chain_runner(filename)
+    stored = load_best(filename)
+    persisted = runner.evaluate_cached(stored)[0] if stored else float('inf')
+
+    start = create_split_solution(runner)
+    objective, feasible, _ = runner.evaluate_solution(start)
+    if not feasible:
+        print("ERROR- Initial result is not feasible")
+        return None
+
+    temperatures = temperature_ladder(runner, start, objective, n_chains)
+    staleness_limit = max(iterations // 100, 1) if budget is None else 1
+    chains = [new_chain(runner, start, objective, t, seed * 1000 + k, staleness_limit)
+              for k, t in enumerate(temperatures)]
+    runner.tabu = None
+    random.seed(seed)
+
+    print("=== Parallel Tempering ===")
+    print(filename, "| Chains:", n_chains, "| Steps per chain:", iterations, "| Swap every:", SWAP_EVERY)
+    print("Temperatures:", [round(t, 2) for t in temperatures])
+    print("Initial objective:", objective, "| Best objective:", persisted)
+
+    best_solution, best_objective = copy_solution(start), objective
+    # swaps[k]: [attempts, accepted] between temperatures k and k + 1
+    swaps = [[0, 0] for _ in range(n_chains - 1)]
+    with ProcessPoolExecutor(max_workers=max_workers or n_chains) as executor:
+        done_steps = 0
+        rounds = 0
+        while (iterations is None or done_steps < iterations) and (budget is None or not budget.expired()):
+            steps = SWAP_EVERY if iterations is None else min(SWAP_EVERY, iterations - done_steps)
+            stop_at = time.time() + time_limit - budget.elapsed() if budget is not None else None
+            chains = list(executor.map(run_chain, [filename] * n_chains, chains, [steps] * n_chains,
+                                       [stop_at] * n_chains))
+            done_steps += steps
+            if budget is not None:
+                for chain in chains:
+                    chain["staleness_limit"] = max(budget.estimate_iterations(chain["step"]) // 100, 1)
+
+            for chain in chains:
+                if chain["best_objective"] < best_objective:
+                    best_solution, best_objective = copy_solution(chain["best_solution"]), chain["best_objective"]
+            if best_objective < persisted:
+                save_best(filename, best_solution, best_objective)
+                persisted = best_objective
+
+            swap_chains(chains, rounds % 2, swaps)
+            rounds += 1
+            if rounds % 10 == 0:
+                print("Step:", done_steps, "| Best objective:", best_objective,
+                      "| Chain objectives:", [chain["objective"] for chain in chains])
+
+    print("Swap acceptance:", [round(accepted / attempts, 2) if attempts else None for attempts, accepted in swaps])
+    print("Move acceptance:", [round(chain["accepted"] / max(chain["step"], 1), 2) for chain in chains])
+    if budget is not None:
+        budget.report(sum(chain["step"] for chain in chains))
+    print("Best objective:", best_objective)
+    return best_solution
@@ -0,0 +1,169 @@
+import random
+from collections import deque
+from Common import copy_solution
+from Neighbours import Neighbours
+
+
+### ROUTE OPT:
+# 2-opt and Or-opt on the truck route (part1), driven by the truck neighbour lists of Neighbours.py.
+#
+# Only truck nodes without a sortie attached (neither launch nor reconvene point) are moved. Every sortie keeps its
+# launch and reconvene nodes, in the same order, so the drone sequencing stays valid and the cells in part3/part4
+# just follow their nodes.
+# - 2-opt: reverse a stretch of free nodes so that a node and one of its neighbours end up next to each other.
+# - Or-opt: move a chain of up to OR_OPT_CHAIN free nodes, either way round, next to one of the first node's neighbours.
+# A move is a reordering of a range of truck positions, (start, order), and is scored with runner.evaluate_truck_reorder
+# on the timing cache, which only re-simulates from the range on.
+#
+# route_opt is the SA operator (best move around one random node), route_polish the standalone pass:
+# first-improvement with don't-look bits, where a node is only looked at again once the route around it changed.
+
+# Neighbour list length when the runner has no granular lists of its own
+ROUTE_OPT_K = 10
+OR_OPT_CHAIN = 3
+
+
+def route_opt(runner, solution, bound=None):
+    #Best 2-opt/Or-opt move around a random truck node. Returns the solution itself when no move is feasible (within bound).
+    part1 = solution["part1"]
+    if len(part1) < 4:
+        total, _ = runner.evaluate_cached(solution)
+        return solution, total
+
+    cache = runner.build_timing_cache(solution)
+    node = random.choice(part1[1:-1])
+    best_move = None
+    best_objective = float('inf')
+    for start, order in node_moves(solution, truck_neighbours(runner), node):
+        # Only a move that beats the best so far matters, so the scoring stops once it passes that
+        limit = best_objective if bound is None else min(bound, best_objective)
+        objective, feas = runner.evaluate_truck_reorder(cache, start, order, limit)
+        if objective < best_objective and feas:
+            best_move = (start, order)
+            best_objective = objective
+
+    if best_move is None:
+        total, _ = runner.evaluate_cached(solution)
+        return solution, total
+
+    candidate = apply_reorder(copy_solution(solution), *best_move)
+    runner.remember(candidate, best_objective, True)
+    return candidate, best_objective
+
+
+def route_polish(runner, solution, max_moves=None):
+    """
+    2-opt/Or-opt descent on the truck route until no node has an improving move left (or after max_moves moves).
+    Returns the polished copy of solution and its objective.
+    """
+    candidate = copy_solution(solution)
+    objective, _ = runner.evaluate_cached(candidate)
+    neighbours = truck_neighbours(runner)
+
+    # Don't-look bits: only the nodes in the queue are looked at
+    queue = deque(candidate["part1"][1:-1])
+    active = set(queue)
+    cache = runner.build_timing_cache(candidate)
+    moves = 0
+    while queue and (max_moves is None or moves < max_moves):
+        node = queue.popleft()
+        active.discard(node)
+        for start, order in node_moves(candidate, neighbours, node):
+            total, feas = runner.evaluate_truck_reorder(cache, start, order, objective)
+            if total < objective and feas:
+                apply_reorder(candidate, start, order)
+                objective = total
+                moves += 1
+                cache = runner.build_timing_cache(candidate)
+                # The nodes in and around the reordered range (node among them) get looked at again
+                part1 = candidate["part1"]
+                for other in part1[max(start - 1, 1):min(start + len(order) + 1, len(part1) - 1)]:
+                    if other not in active:
+                        active.add(other)
+                        queue.append(other)
+                break
+
+    if moves:
+        runner.remember(candidate, objective, True)
+    return candidate, objective
+
+
+def truck_neighbours(runner):
+    #The runner's granular truck lists if it has them, otherwise ROUTE_OPT_K lists built on first use
+    if runner.neighbours is not None:
+        return runner.neighbours.truck
+    if runner.route_neighbours is None:
+        runner.route_neighbours = Neighbours(runner.truck_times, runner.drone_times, ROUTE_OPT_K)
+    return runner.route_neighbours.truck
+
+
+def node_moves(solution, neighbours, node):
+    #(start, order) reorderings of part1 that put node next to one of its truck neighbours, moving free nodes only
+    part1 = solution["part1"]
+    last = len(part1) - 1
+    position = Neighbours.positions(part1)
+    i = position.get(node)
+    if i is None:
+        return []
+    fixed = fixed_from(solution)
+
+    moves = []
+    for neighbour in neighbours[node]:
+        j = position.get(neighbour)
+        if j is None:
+            if neighbour != part1[0]:
+                continue
+            # Next to the depot: right after the start or right before the end
+            gaps = (0, last - 1)
+        else:
+            gaps = (j, j - 1)
+            # 2-opt: reverse i+1..j (node, neighbour) or j..i-1 (neighbour, node)
+            a, b = (i + 1, j) if i < j else (j, i - 1)
+            if b > a and fixed[a] > b:
+                moves.append((a, list(range(b, a - 1, -1))))
+
+        # Or-opt: the chain i..i+length-1 goes into the gap after position g, in either direction
+        for length in range(1, OR_OPT_CHAIN + 1):
+            if fixed[i] <= i + length - 1:
+                break
+            chain = list(range(i, i + length))
+            for g in gaps:
+                if i - 1 <= g <= i + length - 1:
+                    continue
+                for placed in (chain, chain[::-1]):
+                    if length == 1 and placed is not chain:
+                        continue
+                    if g > i:
+                        moves.append((i, list(range(i + length, g + 1)) + placed))
+                    else:
+                        moves.append((g + 1, placed + list(range(g + 1, i))))
+    return moves
+
+
+def fixed_from(solution):
+    #fixed[p]: the first position >= p that cannot move (a depot or a launch/reconvene point)
+    part1 = solution["part1"]
+    n = len(part1)
+    attached = [False] * n
+    attached[0] = attached[n - 1] = True
+    for part in (solution["part3"], solution["part4"]):
+        for x in part:
+            if x != -1:
+                attached[x - 1] = True
+    fixed = [n - 1] * n
+    nxt = n - 1
+    for p in range(n - 1, -1, -1):
+        if attached[p]:
+            nxt = p
+        fixed[p] = nxt
+    return fixed
+
+
+def apply_reorder(solution, start, order):
+    #New position start + j gets the node of position order[j]; launch/reconvene cells follow their nodes
+    part1 = solution["part1"]
+    new_index = {p: start + j for j, p in enumerate(order)}
+    solution["part1"] = part1[:start] + [part1[p] for p in order] + part1[start + len(order):]
+    for key in ("part3", "part4"):
+        solution[key] = [x if x == -1 else new_index.get(x - 1, x - 1) + 1 for x in solution[key]]
+    return solution
@@ -2,10 +2,13 @@ import copy
 from OneReinsert import one_reinsert
 import random
 import math
-from Common import copy_solution
+from Common import copy_solution, acceptance_bound
+from TimeBudget import TimeBudget, budget_steps, CALIBRATION_SHARE, MIN_CALIBRATION
 
-def sim_ann(runner, iterations):
-    split = iterations // 100
+def sim_ann(runner, iterations, time_limit=None):
+    #With time_limit (seconds): run until that deadline, cooling by elapsed time (see TimeBudget.py)
+    budget = TimeBudget(time_limit) if time_limit is not None else None
+    split = iterations // 100 if iterations is not None else None
     rand = random.randint(0,100)
     rand = rand/100
     delta_w = []
@@ -21,8 +24,11 @@ def sim_ann(runner, iterations):
     else:
         print("ERROR- Initial result is not feasible")
 
+    #Solutions evaluated recently, not evaluated again when an operator proposes them (see Tabu.py)
+    runner.start_tabu(incumbent_solution, incumbent_objective)
 
-    for w in range(split):
+
+    for w in budget_steps(split, budget, until=CALIBRATION_SHARE, minimum=MIN_CALIBRATION):
         rand = random.randint(0,100)
         rand = rand/100
         
@@ -34,21 +40,23 @@ def sim_ann(runner, iterations):
         if not candidate_solution:
             print("No insertion positions found, continuing to next iteration from calibration-split.")
             continue
-        candidate_feasible = runner.is_solution_feasible(candidate_solution)
+        #A recent solution comes back unevaluated, with its stored objective (see Tabu.py). It is only counted in delta_w.
+        candidate_objective, candidate_feasible, skipped = runner.evaluate_candidate(candidate_solution)
 
         delta_e = candidate_objective - incumbent_objective
         if candidate_feasible and (delta_e < 0):
-            incumbent_solution = copy_solution(candidate_solution)
-            incumbent_objective = candidate_objective
-            if incumbent_objective < best_objective:
-                best_solution =copy_solution(incumbent_solution)
-                print()
-                print("New best solution found")
-                print(best_solution)
-                print(best_objective)
+            if not skipped:
+                incumbent_solution = copy_solution(candidate_solution)
+                incumbent_objective = candidate_objective
+                if incumbent_objective < best_objective:
+                    best_solution =copy_solution(incumbent_solution)
+                    print()
+                    print("New best solution found")
+                    print(best_solution)
+                    print(best_objective)
 
         elif candidate_feasible:
-            if rand < 0.8: 
+            if rand < 0.8 and not skipped:
                 incumbent_solution = copy_solution(candidate_solution)
             delta_w.append(delta_e)
     if len(delta_w) == 0:
@@ -57,14 +65,25 @@ def sim_ann(runner, iterations):
 
     delta_avg = sum(delta_w)/len(delta_w)
     t_0 = (-1 * delta_avg)/(math.log(0.8))
-    alpha = (t_f / t_0) ** (1/(iterations - split))
+    if budget is None:
+        alpha = (t_f / t_0) ** (1/(iterations - split))
+    else:
+        # Calibration is over; t follows the elapsed time from here
+        split = w + 1
+        alpha = 1.0
     t = t_0
+    iterations_done = split
     
-    for i in range(iterations - split):
+    for i in budget_steps(iterations - split if iterations is not None else None, budget):
+        iterations_done = i + split + 1
+        if budget is not None:
+            t = budget.temperature(t_0, t_f, i, iterations - split if iterations is not None else None)
         rand = random.randint(0,100)
         rand = rand/100
         early_stop_counter += 1
         if early_stop_counter > 5000:
+            if budget is not None:
+                budget.report(iterations_done)
             return best_solution
         if (i % 100 == 0):
             print()
@@ -73,11 +92,14 @@ def sim_ann(runner, iterations):
             print("Random:", rand)
         #print("incumb")
         #print(incumbent_runner.solution)
-        candidate_solution, candidate_objective = one_reinsert(runner, incumbent_solution)
+        #Candidates above the acceptance bound for this rand would be rejected, so their evaluation is cut short.
+        bound = acceptance_bound(incumbent_objective, t, rand)
+        candidate_solution, candidate_objective = one_reinsert(runner, incumbent_solution, bound)
         if not candidate_solution:
             print("No insertion positions found, continuing to next iteration.")
             continue
-        candidate_feasible = runner.is_solution_feasible(candidate_solution)
+        #A recent solution is not evaluated again (see Tabu.py) and is not moved to; the schedule goes on as usual.
+        candidate_objective, candidate_feasible, skipped = runner.evaluate_candidate(candidate_solution, bound)
         #print("cand")
         #print(candidate_runner.solution)
 
@@ -91,7 +113,7 @@ def sim_ann(runner, iterations):
             print("t", t)
             print("t_0", t_0)
             return "Error"
-        if candidate_feasible and (delta_e < 0):
+        if not skipped and candidate_feasible and (delta_e < 0):
             incumbent_solution = copy_solution(candidate_solution)
             incumbent_objective = candidate_objective
             
@@ -105,7 +127,7 @@ def sim_ann(runner, iterations):
                 print(best_objective)
                 early_stop_counter = 0
                 
-        elif candidate_feasible and (rand <  p):
+        elif not skipped and candidate_feasible and (rand <  p):
             if delta_e != 0:
                 incumbent_solution = copy_solution(candidate_solution)
                 incumbent_objective = candidate_objective
@@ -119,4 +141,7 @@ def sim_ann(runner, iterations):
 
         t = alpha * t
 
+    print("Tabu:", runner.tabu_stats())
+    if budget is not None:
+        budget.report(iterations_done)
     return best_solution
\ No newline at end of file
@@ -2,13 +2,16 @@ import copy
 from OneReinsert import one_reinsert
 import random
 import math
-from Common import copy_solution
+from Common import copy_solution, acceptance_bound
+from TimeBudget import TimeBudget, budget_steps, CALIBRATION_SHARE, MIN_CALIBRATION
 from TruckSectionReinsert import truck_section_reinsert
 from FlattenSection import flatten_section
 
-def sim_ann_multiple_ops(runner, iterations):
-    # Calibration split:
-    split = iterations // 100
+def sim_ann_multiple_ops(runner, iterations, time_limit=None):
+    #With time_limit (seconds): run until that deadline, cooling by elapsed time (see TimeBudget.py)
+    budget = TimeBudget(time_limit) if time_limit is not None else None
+    # Calibration split (with a time budget only an upper limit):
+    split = iterations // 100 if iterations is not None else None
     delta_w = []
     t_f = 0.1
 
@@ -35,9 +38,12 @@ def sim_ann_multiple_ops(runner, iterations):
     else:
         print("ERROR- Initial result is not feasible")
 
+    #Solutions evaluated recently, not evaluated again when an operator proposes them (see Tabu.py)
+    runner.start_tabu(incumbent_solution, incumbent_objective)
+
 
     #-- Calibrate temperature
-    for w in range(split):
+    for w in budget_steps(split, budget, until=CALIBRATION_SHARE, minimum=MIN_CALIBRATION):
         rand = random.randint(0,100)
         rand = rand/100
         
@@ -58,24 +64,26 @@ def sim_ann_multiple_ops(runner, iterations):
 
 
 
-        candidate_feasible = runner.is_solution_feasible(candidate_solution)
+        #A recent solution comes back unevaluated, with its stored objective (see Tabu.py). It is only counted in delta_w.
+        candidate_objective, candidate_feasible, skipped = runner.evaluate_candidate(candidate_solution)
 
         delta_e = candidate_objective - incumbent_objective
         if candidate_feasible and (delta_e < 0):
-            incumbent_solution = copy_solution(candidate_solution)
-            incumbent_objective = candidate_objective
-            # scores[op] += improvement_reward
-            
-            if incumbent_objective < best_objective:
-                best_solution =copy_solution(incumbent_solution)
-                print()
-                print("New best solution found")
-                print(best_solution)
-                print(best_objective)
-                # scores[op] += new_best_reward
+            if not skipped:
+                incumbent_solution = copy_solution(candidate_solution)
+                incumbent_objective = candidate_objective
+                # scores[op] += improvement_reward
+
+                if incumbent_objective < best_objective:
+                    best_solution =copy_solution(incumbent_solution)
+                    print()
+                    print("New best solution found")
+                    print(best_solution)
+                    print(best_objective)
+                    # scores[op] += new_best_reward
 
         elif candidate_feasible:
-            if rand < 0.8: 
+            if rand < 0.8 and not skipped:
                 incumbent_solution = copy_solution(candidate_solution)
                 incumbent_objective = candidate_objective
                 # scores[op] += sa_accept_reward
@@ -92,11 +100,20 @@ def sim_ann_multiple_ops(runner, iterations):
 
     delta_avg = sum(delta_w)/len(delta_w)
     t_0 = (-1 * delta_avg)/(math.log(0.8))
-    alpha = (t_f / t_0) ** (1/(iterations - split))
+    if budget is None:
+        alpha = (t_f / t_0) ** (1/(iterations - split))
+    else:
+        # Calibration is over; t follows the elapsed time from here
+        split = w + 1
+        alpha = 1.0
     t = t_0
+    iterations_done = split
     
     # Main iteration loop:
-    for i in range(iterations - split):
+    for i in budget_steps(iterations - split if iterations is not None else None, budget):
+        iterations_done = i + split + 1
+        if budget is not None:
+            t = budget.temperature(t_0, t_f, i, iterations - split if iterations is not None else None)
         rand = random.randint(0,100)
         rand = rand/100
 
@@ -106,13 +123,16 @@ def sim_ann_multiple_ops(runner, iterations):
             print("Weights")
             print(weights)
 
+        #Candidates above the acceptance bound for this rand would be rejected, so their evaluation is cut short.
+        bound = acceptance_bound(incumbent_objective, t, rand)
+
         op = random.choices([0, 1, 2], weights=weights)[0]
         if op == 0:
-            candidate_solution, candidate_objective = one_reinsert(runner, incumbent_solution)
+            candidate_solution, candidate_objective = one_reinsert(runner, incumbent_solution, bound)
         elif op == 1:
-            candidate_solution, candidate_objective = truck_section_reinsert(runner, incumbent_solution)
+            candidate_solution, candidate_objective = truck_section_reinsert(runner, incumbent_solution, bound)
         else:
-            candidate_solution, candidate_objective = flatten_section(runner, incumbent_solution)
+            candidate_solution, candidate_objective = flatten_section(runner, incumbent_solution, bound)
 
         #If no insertions are found using one-reinsert, it will return none.
         if not candidate_solution:
@@ -120,8 +140,8 @@ def sim_ann_multiple_ops(runner, iterations):
                 print("No insertion positions found, continuing to next iteration from calibration-split.")
             continue
 
-        #Check feasibility
-        candidate_feasible = runner.is_solution_feasible(candidate_solution)
+        #Check feasibility. A recent solution is not evaluated again (see Tabu.py) and is not moved to.
+        candidate_objective, candidate_feasible, skipped = runner.evaluate_candidate(candidate_solution, bound)
 
         delta_e = candidate_objective - incumbent_objective
 
@@ -140,7 +160,7 @@ def sim_ann_multiple_ops(runner, iterations):
                 return "Error"
         
 
-        if candidate_feasible and (delta_e < 0):
+        if not skipped and candidate_feasible and (delta_e < 0):
             incumbent_solution = copy_solution(candidate_solution)
             incumbent_objective = candidate_objective
             # scores[op] += improvement_reward
@@ -155,7 +175,7 @@ def sim_ann_multiple_ops(runner, iterations):
                 print(best_objective)
                 # scores[op] += new_best_reward
                 
-        elif candidate_feasible and (rand <  p):
+        elif not skipped and candidate_feasible and (rand <  p):
             if delta_e != 0:
                 incumbent_solution = copy_solution(candidate_solution)
                 incumbent_objective = candidate_objective
@@ -168,6 +188,9 @@ def sim_ann_multiple_ops(runner, iterations):
     
     print("final weights:")
     print(weights)
+    print("Tabu:", runner.tabu_stats())
+    if budget is not None:
+        budget.report(iterations_done)
 
 
     return best_solution
\ No newline at end of file
@@ -1,5 +1,10 @@
-from FeasibiltyCheck import SolutionFeasibility
+from FeasibiltyCheck import SolutionFeasibility, FEASIBLE, FLIGHT_RANGE
 from CalCulateTotalArrivalTime import CalCulateTotalArrivalTime
+from CompactSolution import CompactSolution
+from SortieRange import SortieRange
+from Neighbours import Neighbours
+from Tabu import ZobristHash, TabuList
+from collections import OrderedDict
 import copy
 
 
@@ -16,7 +21,11 @@ class SolutionRunner(CalCulateTotalArrivalTime, SolutionFeasibility):
         max_iterations: int = 10,
         convergence_threshold: float = 1.0,
         n_drones: int = 2,
-        
+        batch_evaluation: bool = False,
+        backend: str = "auto",
+        memo_size: int = 4096,
+        granular_k: int = None,
+        tabu_size: int = 1000,
     ):
         """
         Wraps feasibility check + total cost calculation in one object.
@@ -30,9 +39,36 @@ class SolutionRunner(CalCulateTotalArrivalTime, SolutionFeasibility):
         self.convergence_threshold = convergence_threshold
         self.n_drones = n_drones
         self.n_nodes=n_nodes
+        # Operators submit their whole candidate set to calculate_total_waiting_time_batch instead of scoring one by one
+        self.batch_evaluation = batch_evaluation
 
         n_nodes = truck_times.shape[0]
 
+        # Native nested-list copies of the matrices for the evaluator's inner loop
+        self.build_lookups()
+        # Python or compiled (Numba) evaluator
+        self.select_backend(backend)
+        # Range-feasible (launch, customer, reconvene) sorties, so operators skip hopeless drone insertions
+        self.sortie_range = SortieRange(drone_times, flight_range_limit)
+        # k-nearest candidate lists for the insertion operators, None for the exhaustive scan
+        self.set_granular_k(granular_k)
+        # Truck neighbour lists for RouteOpt when there are no granular lists, built on first use
+        self.route_neighbours = None
+
+        # LRU memo per solution for evaluate_cached/evaluate_solution. memo_size=0 disables it.
+        # Entries are [objective, feasible, reason, exact]: reason is the validate() code once known (else None),
+        # and exact=False means the walk was cut short, so objective only records a bound the true value is above.
+        self.memo_size = memo_size
+        self.memo = OrderedDict()
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.memo_evictions = 0
+
+        # Zobrist keys for solution hashes, and the recent-solution list of the SA loops (start_tabu). tabu_size=0 disables it.
+        self.zobrist = ZobristHash(truck_times.shape[0], n_drones)
+        self.tabu_size = tabu_size
+        self.tabu = None
+
         # Create feasibility checker based on the instance
         self.feasibility = SolutionFeasibility(
             #n_nodes=n_nodes,
@@ -58,26 +94,22 @@ class SolutionRunner(CalCulateTotalArrivalTime, SolutionFeasibility):
         f = self.feasibility
 
         #print("=== FEASIBILITY CHECK ===")
-        truck_ok = f.is_truck_route_feasible(sol)
-        complete_ok = f.is_complete_solution(sol)
-        parts_ok = f.are_parts_consistent(sol)
-        drones_ok = f.are_all_drone_trips_feasible(sol)
-        global_ok = f.is_solution_feasible(sol)
+        global_ok, reason = f.validate(sol)
 
-        debug_print("Truck feasible   :", truck_ok)
-        debug_print("Complete         :", complete_ok)
-        debug_print("Parts consistent :", parts_ok)
-        debug_print("Drone trips OK   :", drones_ok)
+        if debug:
+            # The individual checks are only needed for the report
+            debug_print("Truck feasible   :", f.is_truck_route_feasible(sol))
+            debug_print("Complete         :", f.is_complete_solution(sol))
+            debug_print("Parts consistent :", f.are_parts_consistent(sol))
+            debug_print("Drone trips OK   :", f.are_all_drone_trips_feasible(sol))
 
         if not global_ok:
             debug_print("\nCannot calculate the total cost, since the solution is not feasible.")
-            debug_print("GLOBAL FEASIBLE  :", global_ok)
+            debug_print("GLOBAL FEASIBLE  :", global_ok, "(" + reason + ")")
             return {'error': '', 'feasible': False, 'objective': 0.0} 
 
         # If we get here, the solution is feasible → compute total waiting time
-        total, arr, dep, feas = self.calculate_total_waiting_time(
-            solution=sol
-        )
+        total, feas = self.evaluate_cached(sol)
         
         if not feas:
            debug_print("GLOBAL FEASIBLE  :", feas) 
@@ -88,6 +120,123 @@ class SolutionRunner(CalCulateTotalArrivalTime, SolutionFeasibility):
         debug_print("Total objective:", float(total))
         return {'error': '', 'feasible': True, 'objective': total}#total, arr, dep
 
+    def evaluate_cached(self, solution, bound=None):
+        """
+        Objective and feasibility of a solution, memoized on its four parts.
+        The search keeps coming back to the same solutions (operator fallbacks return the incumbent,
+        flatten_section can return its input, short reinsert cycles), so these are only simulated once.
+        With a bound, a result above it comes back as inf like calculate_total_waiting_time; for such
+        cut-short results only the bound is stored, which answers later calls with the same or a lower bound.
+        """
+        return self.memo_evaluate(self.memo_key(solution), solution, bound)
+
+    def evaluate_solution(self, solution, bound=None):
+        """
+        Objective, feasibility and reason code (see FeasibiltyCheck) of a candidate in one call, for the search loops.
+        The parts are decoded once for both validate() and the timeline. Both results are memoized, so a candidate
+        the operator already evaluated is only validated, and a revisited one costs a single lookup.
+        """
+        if isinstance(solution, CompactSolution):
+            solution = solution.to_dict()
+        key = self.memo_key(solution)
+
+        cached = self.memo.get(key)
+        reason = cached[2] if cached is not None else None
+        if reason is None:
+            _, reason = self.validate(solution)
+
+        total, feas = self.memo_evaluate(key, solution, bound)
+        entry = self.memo.get(key)
+        if entry is not None:
+            entry[2] = reason
+
+        if reason == FEASIBLE and not feas:
+            reason = FLIGHT_RANGE
+        return total, reason == FEASIBLE, reason
+
+    def remember(self, solution, total, feas):
+        #For objectives computed elsewhere (delta evaluation), so evaluate_solution does not simulate them again.
+        if self.memo_size > 0 and total != float('inf'):
+            self.memo_store(self.memo_key(solution), [total, feas, None, True])
+
+    def memo_key(self, solution):
+        return (tuple(solution["part1"]), tuple(solution["part2"]), tuple(solution["part3"]), tuple(solution["part4"]))
+
+    def memo_evaluate(self, key, solution, bound):
+        cached = self.memo.get(key)
+        if cached is not None:
+            total, feas, reason, exact = cached
+            if exact or (bound is not None and bound <= total):
+                self.memo_hits += 1
+                self.memo.move_to_end(key)
+                if not exact or (bound is not None and feas and total > bound):
+                    return float('inf'), feas
+                return total, feas
+
+        self.memo_misses += 1
+        total, _, _, feas = self.calculate_total_waiting_time(solution, bound)
+        if self.memo_size > 0:
+            reason = cached[2] if cached is not None else None
+            if total != float('inf'):
+                self.memo_store(key, [total, feas, reason, True])
+            elif bound is not None:
+                self.memo_store(key, [bound, feas, reason, False])
+        return total, feas
+
+    def memo_store(self, key, entry):
+        if key in self.memo:
+            self.memo.move_to_end(key)
+        self.memo[key] = entry
+        if len(self.memo) > self.memo_size:
+            self.memo.popitem(last=False)
+            self.memo_evictions += 1
+
+    def set_granular_k(self, k):
+        #Restrict insertion trials to the k nearest neighbours of the inserted node (see Neighbours.py). None tries every position.
+        self.granular_k = k
+        self.neighbours = Neighbours(self.truck_times, self.drone_times, k) if k else None
+
+    def memo_stats(self):
+        lookups = self.memo_hits + self.memo_misses
+        return {
+            "size": len(self.memo),
+            "capacity": self.memo_size,
+            "hits": self.memo_hits,
+            "misses": self.memo_misses,
+            "evictions": self.memo_evictions,
+            "hit_rate": self.memo_hits / lookups if lookups else 0.0,
+        }
+
+    def start_tabu(self, solution=None, objective=None):
+        #Fresh tabu list for a search run (None when disabled), holding the start solution if one is given.
+        #The operators consult runner.tabu as well.
+        self.tabu = TabuList(self.tabu_size) if self.tabu_size > 0 else None
+        if self.tabu is not None and solution is not None:
+            self.tabu.add(self.zobrist.solution_hash(solution), objective)
+        return self.tabu
+
+    def evaluate_candidate(self, solution, bound=None):
+        """
+        evaluate_solution for the SA loops, through runner.tabu. Returns (objective, feasible, skipped).
+        A candidate in the tabu list is not evaluated again: its stored objective and feasibility come back with
+        skipped=True, for the loop's statistics, and the loop does not move to it. Any other candidate is evaluated
+        and entered in the list.
+        """
+        tabu = self.tabu
+        if tabu is None:
+            objective, feasible, _ = self.evaluate_solution(solution, bound)
+            return objective, feasible, False
+        h = self.zobrist.solution_hash(solution)
+        entry = tabu.lookup(h)
+        if entry is not None:
+            return entry[0], entry[1], True
+        objective, feasible, _ = self.evaluate_solution(solution, bound)
+        tabu.add(h, objective, feasible)
+        return objective, feasible, False
+
+    def tabu_stats(self):
+        return self.tabu.stats() if self.tabu is not None else {}
+
     def copy(self):
         return(
             SolutionRunner(
@@ -99,5 +248,10 @@ class SolutionRunner(CalCulateTotalArrivalTime, SolutionFeasibility):
                 max_iterations=self.max_iterations,
                 convergence_threshold=self.convergence_threshold,
                 n_drones=self.n_drones,
+                batch_evaluation=self.batch_evaluation,
+                backend=self.backend,
+                memo_size=self.memo_size,
+                granular_k=self.granular_k,
+                tabu_size=self.tabu_size,
             )
         )
\ No newline at end of file
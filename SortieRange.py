@@ -0,0 +1,54 @@
+import numpy as np
+
+
+### SORTIE RANGE:
+# Which sorties (launch node, customer, reconvene node) fit within the drone flight range, built once per instance.
+#
+# reach[customer][launch] is a bitmask over reconvene nodes: bit r is set when
+# drone_times[launch][customer] + drone_times[customer][r] <= flight_range.
+# That is the same sum the evaluator compares against the range (hovering only adds to it), so a pair whose bit is
+# not set can never give a feasible candidate and the insertion operators skip it before building anything.
+#
+# The full (launch, customer, reconvene) duration tensor is n^3 floats, and indexing a NumPy array from the operators'
+# Python loops is slower than the check itself, so only one customer's slice is materialized at a time (durations())
+# and the bitmasks (n^2 Python ints) are what the operators look up.
+
+
+class SortieRange:
+    __slots__ = ("drone_times", "flight_range", "reach", "pairs")
+
+    def __init__(self, drone_times, flight_range):
+        self.drone_times = np.asarray(drone_times, dtype=np.float64)
+        self.flight_range = flight_range
+        self.reach = [self.reach_masks(c) for c in range(self.drone_times.shape[0])]
+        # feasible_pairs() per customer, filled on first use
+        self.pairs = {}
+
+    def durations(self, customer):
+        #Sortie durations for one customer as a (launch, reconvene) matrix, i.e. one slice of the full tensor.
+        drone_times = self.drone_times
+        return drone_times[:, customer][:, None] + drone_times[customer, :][None, :]
+
+    def reach_masks(self, customer):
+        packed = np.packbits(self.durations(customer) <= self.flight_range, axis=1, bitorder="little")
+        return [int.from_bytes(row.tobytes(), "little") for row in packed]
+
+    def fits(self, launch, customer, reconvene):
+        return (self.reach[customer][launch] >> reconvene) & 1 == 1
+
+    def feasible_pairs(self, customer):
+        """
+        (launch, reconvene) node pairs whose sortie to customer fits the range, shortest sortie first.
+        The customer itself is left out as a launch or reconvene node.
+        """
+        pairs = self.pairs.get(customer)
+        if pairs is None:
+            durations = self.durations(customer)
+            fits = durations <= self.flight_range
+            fits[customer, :] = False
+            fits[:, customer] = False
+            launch, reconvene = np.nonzero(fits)
+            order = np.argsort(durations[launch, reconvene], kind="stable")
+            pairs = list(zip(launch[order].tolist(), reconvene[order].tolist()))
+            self.pairs[customer] = pairs
+        return pairs
@@ -0,0 +1,200 @@
+import random
+from itertools import combinations
+from CreateInitSolution import create_initial_solution
+from RouteOpt import route_polish, truck_neighbours
+
+
+### SPLIT:
+# Route first, cluster second: a giant tour (every customer once, in order) is split into the best truck route and
+# sorties for our two drones by dynamic programming over the tour positions.
+#
+# The split builds the route from operations (i, k, D): the truck goes from tour position i to position k, serving the
+# customers between them that are not in D, and each customer in D (at most one per drone) is flown from the node at i
+# to the node at k. A plain truck leg is (i, i + 1, ()). Operations follow each other, so a drone's sorties are
+# sequenced by construction; both drones of an operation share its launch and reconvene node.
+#
+# The sum of arrival times splits over operations: with A_i the truck arrival at position i, every customer after
+# position k waits for A_k - A_i, so an operation costs the arrivals within it (relative to A_i) plus
+# (A_k - A_i) * (customers after k). Timing follows the evaluator exactly: drones launch at the truck arrival or on
+# return from the previous operation, the truck leaves once every drone is back, and hovering counts against the range.
+# The DP state at a position is therefore the cost plus how long after A_k each drone got back; only the labels that
+# no other label beats on all three are kept.
+#
+# Sorties are pruned with runner.sortie_range before any timing, and an operation whose truck leg alone takes
+# longer than the flight range cannot carry a drone (unless it ends at the depot, where hovering does not count).
+# SPLIT_MAX_SPAN caps the tour positions an operation spans.
+
+SPLIT_MAX_SPAN = 6
+
+
+def split_tour(runner, tour, bound=None):
+    """
+    Best solution for the giant tour (a list of all customers), as (solution, objective).
+    With bound, splits whose objective passes it are pruned; (None, inf) if nothing is left.
+    """
+    truck_times = runner.truck_lookup
+    drone_times = runner.drone_lookup
+    flight_range = runner.flight_range
+    fits = runner.sortie_range.fits
+    limit = bound * 100.0 if bound is not None else float('inf')
+
+    m = len(tour)
+    nodes = [0] + list(tour) + [0]
+    end = m + 1
+
+    # labels[p]: [cost, r0, r1, previous position, previous label, drone customers as (position, drone)]
+    # r_u is how long after the truck arrival at p drone u gets back there (0 when it is back before the truck)
+    labels = [[] for _ in range(m + 2)]
+    labels[0].append([0.0, 0.0, 0.0, None, None, ()])
+
+    for i in range(end):
+        if not labels[i]:
+            continue
+        a = nodes[i]
+        for k in range(i + 1, min(i + SPLIT_MAX_SPAN, end) + 1):
+            b = nodes[k]
+            after = m - k if k <= m else 0
+            inner = range(i + 1, k)
+            if k == i + 1:
+                drone_sets = [()]
+            else:
+                drone_sets = [(d,) for d in inner] + list(combinations(inner, 2))
+
+            for drone_set in drone_sets:
+                if not all(fits(a, nodes[d], b) for d in drone_set):
+                    continue
+                # Truck leg from the departure at i: duration, and the arrival times of the customers on it
+                leg = 0.0
+                leg_arrivals = 0.0
+                truck_customers = 0
+                prev = a
+                for p in range(i + 1, k + 1):
+                    if p in drone_set:
+                        continue
+                    leg += truck_times[prev][nodes[p]]
+                    prev = nodes[p]
+                    if p <= m:
+                        leg_arrivals += leg
+                        truck_customers += 1
+                # Hovering counts against the range everywhere but at the closing depot
+                if drone_set and b != 0 and leg > flight_range:
+                    continue
+
+                if len(drone_set) == 0:
+                    assignments = [()]
+                elif len(drone_set) == 1:
+                    assignments = [((drone_set[0], 0),), ((drone_set[0], 1),)]
+                else:
+                    assignments = [((drone_set[0], 0), (drone_set[1], 1)), ((drone_set[0], 1), (drone_set[1], 0))]
+
+                for index, label in enumerate(labels[i]):
+                    cost, r0, r1 = label[0], label[1], label[2]
+                    wait = max(r0, r1)
+                    arrival = wait + leg
+                    base = cost + leg_arrivals + truck_customers * wait + arrival * after
+                    for assignment in assignments:
+                        total = base
+                        returned = [0.0, 0.0]
+                        feasible = True
+                        for d, u in assignment:
+                            launch = r0 if u == 0 else r1
+                            c = nodes[d]
+                            flight_out = drone_times[a][c]
+                            total_flight = flight_out + drone_times[c][b]
+                            drone_return = launch + total_flight
+                            drone_wait = max(arrival - drone_return, 0) if b != 0 else 0
+                            if total_flight + drone_wait > flight_range:
+                                feasible = False
+                                break
+                            total += launch + flight_out
+                            returned[u] = max(drone_return - arrival, 0.0)
+                        if not feasible or total > limit:
+                            continue
+                        add_label(labels[k], [total, returned[0], returned[1], i, index, assignment])
+
+    if not labels[end]:
+        return None, float('inf')
+    best = min(range(len(labels[end])), key=lambda x: labels[end][x][0])
+    solution = split_solution(nodes, labels, best)
+    objective, _ = runner.evaluate_cached(solution, bound)
+    return solution, objective
+
+
+def add_label(labels, label):
+    #Keep label unless another one is at least as good on cost and both return offsets; drop the ones it beats.
+    cost, r0, r1 = label[0], label[1], label[2]
+    for other in labels:
+        if other[0] <= cost and other[1] <= r0 and other[2] <= r1:
+            return
+    labels[:] = [other for other in labels if not (cost <= other[0] and r0 <= other[1] and r1 <= other[2])]
+    labels.append(label)
+
+
+def split_solution(nodes, labels, best):
+    #Follows the labels back from the closing depot and encodes the operations as part1-part4.
+    operations = []
+    k, index = len(nodes) - 1, best
+    while labels[k][index][3] is not None:
+        label = labels[k][index]
+        operations.append((label[3], k, label[5]))
+        k, index = label[3], label[4]
+    operations.reverse()
+
+    part1 = [0]
+    sorties = ([], [])
+    for i, k, assignment in operations:
+        launch_cell = len(part1)
+        served = {d for d, u in assignment}
+        part1.extend(nodes[p] for p in range(i + 1, k + 1) if p not in served)
+        for d, u in assignment:
+            sorties[u].append((nodes[d], launch_cell, len(part1)))
+    return {
+        "part1": part1,
+        "part2": [x[0] for x in sorties[0]] + [-1] + [x[0] for x in sorties[1]],
+        "part3": [x[1] for x in sorties[0]] + [-1] + [x[1] for x in sorties[1]],
+        "part4": [x[2] for x in sorties[0]] + [-1] + [x[2] for x in sorties[1]],
+    }
+
+
+def giant_tour(solution):
+    #Customers in truck order, each drone customer right after the node it is launched from
+    launched = {}
+    part2, part3 = solution["part2"], solution["part3"]
+    for node, cell in zip(part2, part3):
+        if node != -1:
+            launched.setdefault(cell, []).append(node)
+    tour = list(launched.get(1, ()))
+    for cell, node in enumerate(solution["part1"][1:-1], 2):
+        tour.append(node)
+        tour.extend(launched.get(cell, ()))
+    return tour
+
+
+def create_split_solution(runner):
+    #Constructor: the farthest insertion tour, improved with 2-opt/Or-opt, then split.
+    truck_only, _ = route_polish(runner, create_initial_solution(runner))
+    solution, _ = split_tour(runner, truck_only["part1"][1:-1])
+    return solution
+
+
+def split_relocate(runner, solution, bound=None):
+    #Operator in the tour space: move one customer of the giant tour next to one of its truck neighbours and split again.
+    tour = giant_tour(solution)
+    if len(tour) < 3:
+        total, _ = runner.evaluate_cached(solution)
+        return solution, total
+
+    node = random.choice(tour)
+    tour.remove(node)
+    targets = [x for x in truck_neighbours(runner)[node] if x != 0]
+    if targets:
+        index = tour.index(random.choice(targets)) + random.randint(0, 1)
+    else:
+        index = random.randint(0, len(tour))
+    tour.insert(index, node)
+
+    candidate, objective = split_tour(runner, tour, bound)
+    if candidate is None:
+        total, _ = runner.evaluate_cached(solution)
+        return solution, total
+    return candidate, objective
@@ -0,0 +1,127 @@
+from collections import OrderedDict
+import numpy as np
+
+
+### TABU MEMORY:
+# Zobrist hashing of solutions, and a bounded list of recently seen solution hashes for the SA loops.
+#
+# A solution hashes to the XOR of one random 64-bit key per directed truck edge and, per sortie, one key for
+# (drone, customer, launch node) and one for (drone, customer, reconvene node). Launch and reconvene keys come from
+# separate tables, so the opening and the closing depot are told apart. The edges of a route starting and ending at
+# the depot fix its order, so equal solutions hash equal whatever path led to them.
+#
+# Each elementary change toggles a fixed number of keys, so a move's hash is known before the move is built:
+#   truck insert/remove of x between a and b : edge(a, b) ^ edge(a, x) ^ edge(x, b)
+#   sortie add/remove                          : launch(drone, customer, l) ^ reconvene(drone, customer, r)
+# Sorties point at truck positions, so the truck changes leave their keys alone, apart from the cells TruckInsert
+# moves onto the inserted node (see TruckInsert.rehash).
+#
+# The SA loops enter every candidate they evaluate, accepted or rejected, into runner.tabu with its objective and
+# feasibility (see SolutionRunner.evaluate_candidate). A candidate that is already in the list (a move straight back
+# to a recent incumbent, or a solution just rejected) is not evaluated again: the loop gets the stored result, counts
+# it in its operator statistics like any other candidate, and does not move to it. one_reinsert drops such moves
+# before scoring them.
+
+
+class ZobristHash:
+    __slots__ = ("edge", "launch", "reconvene")
+
+    def __init__(self, n_nodes, n_drones=2, seed=0):
+        rng = np.random.default_rng(seed)
+
+        def keys(*shape):
+            return rng.integers(0, 2 ** 64, size=shape, dtype=np.uint64).tolist()
+
+        self.edge = keys(n_nodes, n_nodes)
+        self.launch = keys(n_drones, n_nodes, n_nodes)
+        self.reconvene = keys(n_drones, n_nodes, n_nodes)
+
+    def solution_hash(self, solution):
+        part1 = solution["part1"]
+        edge = self.edge
+        h = 0
+        for a, b in zip(part1, part1[1:]):
+            h ^= edge[a][b]
+        drone = 0
+        for node, sender, receiver in zip(solution["part2"], solution["part3"], solution["part4"]):
+            if node == -1:
+                drone += 1
+                continue
+            h ^= self.launch[drone][node][part1[sender - 1]] ^ self.reconvene[drone][node][part1[receiver - 1]]
+        return h
+
+    def truck_insert(self, h, prev, node, next_node):
+        #node goes between prev and next_node
+        edge = self.edge
+        return h ^ edge[prev][next_node] ^ edge[prev][node] ^ edge[node][next_node]
+
+    def truck_remove(self, h, prev, node, next_node):
+        #The same keys as the insertion, XOR undoes itself
+        return self.truck_insert(h, prev, node, next_node)
+
+    def sortie(self, h, drone, node, launch_node, reconvene_node):
+        #Adds the sortie if it is not in h, removes it if it is
+        return h ^ self.launch[drone][node][launch_node] ^ self.reconvene[drone][node][reconvene_node]
+
+
+def sorties_by_cell(solution):
+    #cell -> (drone, customer, launch cell, reconvene cell) of the sorties launched or reconvening there
+    sorties = {}
+    drone = 0
+    for node, sender, receiver in zip(solution["part2"], solution["part3"], solution["part4"]):
+        if node == -1:
+            drone += 1
+            continue
+        sortie = (drone, node, sender, receiver)
+        sorties.setdefault(sender, []).append(sortie)
+        if receiver != sender:
+            sorties.setdefault(receiver, []).append(sortie)
+    return sorties
+
+
+class TabuList:
+    """Recent solution hashes with their (objective, feasible), bounded; the oldest entry goes once it holds `size`."""
+    __slots__ = ("size", "hashes", "checks", "skips", "move_checks", "move_skips")
+
+    def __init__(self, size):
+        self.size = size
+        self.hashes = OrderedDict()
+        # Candidates checked/skipped by the SA loops, and moves checked/skipped inside the operators
+        self.checks = 0
+        self.skips = 0
+        self.move_checks = 0
+        self.move_skips = 0
+
+    def add(self, h, objective, feasible=True):
+        if h in self.hashes:
+            self.hashes.move_to_end(h)
+        self.hashes[h] = (objective, feasible)
+        if len(self.hashes) > self.size:
+            self.hashes.popitem(last=False)
+
+    def lookup(self, h):
+        #(objective, feasible) stored for a candidate the SA loops can skip, None if h is not in the list
+        self.checks += 1
+        entry = self.hashes.get(h)
+        if entry is not None:
+            self.skips += 1
+        return entry
+
+    def skip_move(self, h):
+        self.move_checks += 1
+        if h in self.hashes:
+            self.move_skips += 1
+            return True
+        return False
+
+    def stats(self):
+        return {
+            "size": len(self.hashes),
+            "capacity": self.size,
+            "candidates": self.checks,
+            "skipped": self.skips,
+            "skip_rate": self.skips / self.checks if self.checks else 0.0,
+            "moves": self.move_checks,
+            "moves_skipped": self.move_skips,
+            "move_skip_rate": self.move_skips / self.move_checks if self.move_checks else 0.0,
+        }
@@ -0,0 +1,72 @@
+import time
+
+
+### TIME BUDGET:
+# Wall-clock mode for the search drivers: with time_limit (seconds) a driver runs until the deadline instead of for a
+# number of iterations, so every instance can get the same time slot.
+#
+# The cooling follows the elapsed share of the budget instead of the iteration count: t = t_0 * (t_f / t_0) ** fraction,
+# the same geometric curve the iteration mode walks with alpha, from t_0 at the start to t_f at the deadline.
+# A driver given an iteration cap as well passes its progress, and the fraction is whichever share is further along,
+# so the schedule still ends at t_f when the cap comes before the deadline.
+# Calibration phases run for CALIBRATION_SHARE of the budget, and the iteration rate they reach gives the estimate of
+# the total iteration count that the iteration-based settings (adaptive_sa's staleness window) are sized from.
+# The deadline is checked before every iteration, so a driver overruns it by at most one iteration plus its final save.
+
+CALIBRATION_SHARE = 0.01
+# Calibration iterations even on a short budget, so there are moves to derive t_0 from
+MIN_CALIBRATION = 10
+
+
+class TimeBudget:
+    """Deadline in seconds from creation."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.start = time.perf_counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def fraction(self):
+        #Share of the budget used, 0 at the start and 1 at the deadline
+        return min(self.elapsed() / self.seconds, 1.0) if self.seconds > 0 else 1.0
+
+    def expired(self):
+        return self.elapsed() >= self.seconds
+
+    def temperature(self, t_0, t_f, step=0, steps=None):
+        #step, steps: iterations done and the iteration cap of the loop, None without a cap
+        fraction = self.fraction()
+        if steps:
+            fraction = max(fraction, min(step / steps, 1.0))
+        return t_0 * (t_f / t_0) ** fraction
+
+    def estimate_iterations(self, iterations_done):
+        #Iterations the whole budget allows at the rate reached so far
+        fraction = self.fraction()
+        if fraction <= 0:
+            return iterations_done
+        return int(iterations_done / fraction)
+
+    def report(self, iterations_done):
+        elapsed = self.elapsed()
+        print("Time budget:", self.seconds, "s | used:", round(elapsed, 2), "s | iterations:", iterations_done,
+              "| per second:", round(iterations_done / elapsed, 1) if elapsed > 0 else 0)
+
+
+def budget_steps(iterations, budget=None, start=0, until=1.0, minimum=0):
+    """
+    Iteration numbers for a driver loop: range(start, iterations) without a budget. With one, numbers from start on
+    until `until` of the budget is used (but at least `minimum` of them); iterations is then only an upper limit,
+    None for none.
+    """
+    if budget is None:
+        yield from range(start, iterations)
+        return
+    i = start
+    while iterations is None or i < iterations:
+        if i - start >= minimum and budget.fraction() >= until:
+            return
+        yield i
+        i += 1
@@ -4,15 +4,15 @@
 import random
 from Common import copy_solution
 import bisect
-from OneReinsert import best_single_insert_random_select, random_select_candidate
+from OneReinsert import best_single_insert_random_select, random_select_move
 
-def truck_section_reinsert(runner, solution):
+def truck_section_reinsert(runner, solution, bound=None):
 
     max_section_length = len(solution["part1"])//3
     section_length = random.randint(1,max_section_length+1)
     
     remove_section, leftover_section, interior_nodes, exterior_nodes, orphans, depot_sorties = delete_truck_section(runner, solution, section_length)
-    best_candidate, best_cost = best_section_insert(remove_section, leftover_section, interior_nodes,exterior_nodes, orphans, runner, solution, depot_sorties)
+    best_candidate, best_cost = best_section_insert(remove_section, leftover_section, interior_nodes,exterior_nodes, orphans, runner, solution, depot_sorties, bound)
 
 
     return best_candidate, best_cost
@@ -30,13 +30,6 @@ def delete_truck_section(runner, solution, section_length):
     candidate = copy_solution(solution)
 
 
-    if len(candidate["part1"]) in candidate["part4"]:
-        pos = candidate["part4"].index(len(candidate["part1"]))
-        sep = candidate["part4"].index(-1)
-        if pos < sep:
-            d = 0
-        else:
-            d = 1
     shifted_truck = candidate["part1"][0:-1]
 
     shift = random.randint(0,len(shifted_truck)-1)
@@ -46,6 +39,8 @@ def delete_truck_section(runner, solution, section_length):
     remove_section = shifted_truck[:section_length]
 
     leftover_section = shifted_truck[section_length:]
+    # Membership is tested for every sortie below
+    removed = set(remove_section)
 
     
     interior_nodes = []
@@ -65,9 +60,9 @@ def delete_truck_section(runner, solution, section_length):
             depot_sorties.append((node, sender_node, receiver_node, drone_index))
             continue
 
-        if (sender_node in remove_section) and (receiver_node in remove_section):
+        if (sender_node in removed) and (receiver_node in removed):
             interior_nodes.append((node, sender_node, receiver_node, drone_index))
-        elif (sender_node in remove_section) or (receiver_node in remove_section):
+        elif (sender_node in removed) or (receiver_node in removed):
             orphans.append(node)
         else:
             exterior_nodes.append((node, sender_node, receiver_node, drone_index))
@@ -75,77 +70,54 @@ def delete_truck_section(runner, solution, section_length):
     return(remove_section, leftover_section, interior_nodes, exterior_nodes, orphans, depot_sorties)
 
 
-def best_section_insert(remove_section, leftover_section, interior_nodes, exterior_nodes, orphans, runner, solution, depot_sorties):
+def best_section_insert(remove_section, leftover_section, interior_nodes, exterior_nodes, orphans, runner, solution, depot_sorties, bound=None):
+    # Without orphans the section candidate is the final candidate, so the caller's bound applies to it directly
+    section_bound = bound if (bound is not None and len(orphans) == 0) else float('inf')
     best_cost = float('inf')
     best_candidate = None
+    section_candidates = []
 
-    #For insertion positions
-    for i in range(len(leftover_section)+1):
-        #For orientation
-        for o in range(2):
-            truck_candidate = leftover_section.copy()
-            insert = remove_section.copy()
-            if o == 1:
-                insert.reverse()
-            truck_candidate = leftover_section[:i] + insert + leftover_section[i:]
-
-            # We shift back so 0 is at the start again, and add the 0 at the end back
-            shift = truck_candidate.index(0)
-            truck_candidate = truck_candidate[shift:] + truck_candidate[:shift]
-            truck_candidate.append(0)
-
-            p2d1, p3d1, p4d1 = [], [], []
-            p2d2, p3d2, p4d2 = [], [], []
-
-            exterior_nodes.sort(key=lambda x: truck_candidate.index(x[1]))
-            if o == 0:
-                interior_nodes.sort(key=lambda x: truck_candidate.index(x[1]))
-            else:
-                interior_nodes.sort(key=lambda x: truck_candidate.index(x[2]))
-
-            all_nodes = sorted(
-                exterior_nodes + 
-                [(n, r, s, d) if o == 1 else (n, s, r, d) for n, s, r, d in interior_nodes] +
-                [(n, s, 0, d) for n, s, r, d in depot_sorties if n not in orphans],
-                key=lambda x: truck_candidate.index(x[1])
-            )
-
-            for n, s, r, d in all_nodes:
-                s_index = truck_candidate.index(s)
-                r_index = truck_candidate.index(r) if r != 0 else len(truck_candidate) - 1
-                if d == 0:
-                    p2d1.append(n)
-                    p3d1.append(s_index + 1)
-                    p4d1.append(r_index + 1)
-                else:
-                    p2d2.append(n)
-                    p3d2.append(s_index + 1)
-                    p4d2.append(r_index + 1)
-
-            candidate = {
-                "part1" : truck_candidate,
-                "part2" : p2d1 + [-1] + p2d2,
-                "part3" : p3d1 + [-1] + p3d2,
-                "part4" : p4d1 + [-1] + p4d2,
-            }
-
-            # Very costly if we check orphans for all insert positions. Instead we select ideal insert position first, then add orphans later.
-            obj, arr, dep, feas = runner.calculate_total_waiting_time(candidate)
-            # We could improve performance here by only checking boundaries instead of the whole length.. but this is easier
+    if not runner.batch_evaluation and 0 not in remove_section:
+        # Score the insert positions incrementally, and build only the winning candidate
+        i, o, best_cost = section_insert_scan(runner, remove_section, leftover_section, interior_nodes, exterior_nodes, depot_sorties, section_bound)
+        if i is not None:
+            best_candidate = section_candidate(remove_section, leftover_section, interior_nodes, exterior_nodes, orphans, depot_sorties, i, o)
+    else:
+        #For insertion positions
+        for i in range(len(leftover_section)+1):
+            #For orientation
+            for o in range(2):
+                candidate = section_candidate(remove_section, leftover_section, interior_nodes, exterior_nodes, orphans, depot_sorties, i, o)
+
+                # Very costly if we check orphans for all insert positions. Instead we select ideal insert position first, then add orphans later.
+                if runner.batch_evaluation:
+                    section_candidates.append(candidate)
+                    continue
+                # Only a candidate that beats the best so far matters, so the evaluation stops once it passes that
+                obj, arr, dep, feas = runner.calculate_total_waiting_time(candidate, min(section_bound, best_cost))
+
+                # candidate is rebuilt from scratch every iteration, so it can be kept without a copy
+                if (obj < best_cost) and feas:
+                    best_candidate = candidate
+                    best_cost = obj
 
+    # In batch mode all insert positions and orientations are evaluated in one vectorized call
+    if section_candidates:
+        totals, feasible = runner.calculate_total_waiting_time_batch(section_candidates, section_bound)
+        for candidate, obj, feas in zip(section_candidates, totals, feasible):
             if (obj < best_cost) and feas:
-                best_candidate = copy_solution(candidate)
-                best_cost = obj.copy()
+                best_candidate = candidate
+                best_cost = float(obj)
 
     if best_candidate:    
         if len(orphans) > 0:
             for node in orphans:
-                candidate_tuples = best_single_insert_random_select(runner, best_candidate, node)
+                move_tuples = best_single_insert_random_select(runner, best_candidate, node)
                 
-                if len(candidate_tuples) == 0:
+                if len(move_tuples) == 0:
                     return None, None
                 else:
-                    candidate, objective = random_select_candidate(candidate_tuples)
+                    candidate, objective = random_select_move(best_candidate, move_tuples)
                 if objective < best_cost:
                     best_candidate = candidate
                     best_cost = objective
@@ -156,5 +128,113 @@ def best_section_insert(remove_section, leftover_section, interior_nodes, exteri
     return best_candidate, best_cost
 
 
+### Builds the candidate with the removed section inserted at position i of the leftover section, reversed if o == 1
+def section_candidate(remove_section, leftover_section, interior_nodes, exterior_nodes, orphans, depot_sorties, i, o):
+    insert = remove_section.copy()
+    if o == 1:
+        insert.reverse()
+    truck_candidate = leftover_section[:i] + insert + leftover_section[i:]
+
+    # We shift back so 0 is at the start again, and add the 0 at the end back
+    shift = truck_candidate.index(0)
+    truck_candidate = truck_candidate[shift:] + truck_candidate[:shift]
+    # Node -> index in the new route, instead of a truck_candidate.index() scan per lookup.
+    # Built before the closing depot is added, so the depot maps to 0 like .index(0) did.
+    position = {node: index for index, node in enumerate(truck_candidate)}
+    truck_candidate.append(0)
+
+    p2d1, p3d1, p4d1 = [], [], []
+    p2d2, p3d2, p4d2 = [], [], []
+
+    exterior_nodes.sort(key=lambda x: position[x[1]])
+    if o == 0:
+        interior_nodes.sort(key=lambda x: position[x[1]])
+    else:
+        interior_nodes.sort(key=lambda x: position[x[2]])
+
+    all_nodes = sorted(
+        exterior_nodes + 
+        [(n, r, s, d) if o == 1 else (n, s, r, d) for n, s, r, d in interior_nodes] +
+        [(n, s, 0, d) for n, s, r, d in depot_sorties if n not in orphans],
+        key=lambda x: position[x[1]]
+    )
+
+    for n, s, r, d in all_nodes:
+        s_index = position[s]
+        r_index = position[r] if r != 0 else len(truck_candidate) - 1
+        if d == 0:
+            p2d1.append(n)
+            p3d1.append(s_index + 1)
+            p4d1.append(r_index + 1)
+        else:
+            p2d2.append(n)
+            p3d2.append(s_index + 1)
+            p4d2.append(r_index + 1)
+
+    return {
+        "part1" : truck_candidate,
+        "part2" : p2d1 + [-1] + p2d2,
+        "part3" : p3d1 + [-1] + p3d2,
+        "part4" : p4d1 + [-1] + p4d2,
+    }
+
+
+### Returns the best insert position, orientation and objective of the removed section (None, None, inf if none is feasible)
+#Every candidate route is [0] + R[:i] + section + R[i:] + [0], where R is the leftover route without the depot.
+#The leftover route with the exterior and depot sorties is simulated once, and each candidate is scored from
+#position i + 1 on (runner.evaluate_section_insert), with the section's own sorties given as offsets into the section.
+#The section travel times are the only thing that changes between i, so the scan is about linear in route length.
+#The last insert position of the full scan gives the same route as i = 0 and is skipped.
+def section_insert_scan(runner, remove_section, leftover_section, interior_nodes, exterior_nodes, depot_sorties, bound=None):
+    depot = leftover_section.index(0)
+    leftover_route = leftover_section[depot + 1:] + leftover_section[:depot]
+    base_route = [0] + leftover_route + [0]
+    position = {node: index for index, node in enumerate(base_route[:-1])}
+    offset = {node: index for index, node in enumerate(remove_section)}
+    k = len(remove_section)
+
+    # Sorties that stay on the leftover route, in part2 order: per drone by launch position
+    base_flights = exterior_nodes + [x for x in depot_sorties if x[1] not in offset]
+    base_flights = sorted(base_flights, key=lambda x: (x[3], position[x[1]]))
+    parts = ([], [], [])
+    for d in range(2):
+        if d == 1:
+            for part in parts:
+                part.append(-1)
+        for n, s, r, drone in base_flights:
+            if drone == d:
+                parts[0].append(n)
+                parts[1].append(position[s] + 1)
+                parts[2].append(position[r] + 1 if r != 0 else len(base_route))
+    base = {"part1": base_route, "part2": parts[0], "part3": parts[1], "part4": parts[2]}
+    cache = runner.build_timing_cache(base)
+
+    # Section sorties per orientation, reversing the section swaps launch and reconvene
+    section_flights = []
+    section_depot_flights = []
+    for o in range(2):
+        place = (lambda x: offset[x]) if o == 0 else (lambda x: k - 1 - offset[x])
+        if o == 0:
+            section_flights.append([(n, place(s), place(r), d) for n, s, r, d in interior_nodes])
+        else:
+            section_flights.append([(n, place(r), place(s), d) for n, s, r, d in interior_nodes])
+        section_depot_flights.append([(n, place(s), d) for n, s, r, d in depot_sorties if s in offset])
+    sections = [remove_section, remove_section[::-1]]
+
+    if bound is None:
+        bound = float('inf')
+    best_i, best_o, best_cost = None, None, float('inf')
+    for i in range(len(leftover_route) + 1):
+        for o in range(2):
+            # Only a candidate that beats the best so far matters, so the scoring stops once it passes that
+            obj, feas = runner.evaluate_section_insert(
+                cache, sections[o], i + 1, section_flights[o], section_depot_flights[o], min(bound, best_cost),
+            )
+            if (obj < best_cost) and feas:
+                best_i, best_o, best_cost = i, o, obj
 
+    # Position in the leftover section as the full scan indexes it
+    if best_i is not None:
+        best_i = (best_i + depot + 1) % len(leftover_section)
+    return best_i, best_o, best_cost
 
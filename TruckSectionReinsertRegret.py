@@ -6,14 +6,15 @@ from Common import copy_solution
 import bisect
 from OneReinsert import best_single_insert_random_select, random_select_candidate
 from MultipleReinsert import regret_insert
+from TruckSectionReinsert import section_candidate, section_insert_scan
 
-def truck_section_reinsert_regret(runner, solution):
+def truck_section_reinsert_regret(runner, solution, bound=None):
 
     max_section_length = len(solution["part1"])//3
     section_length = random.randint(1,max_section_length+1)
     
     remove_section, leftover_section, interior_nodes, exterior_nodes, orphans, depot_sorties = delete_truck_section(runner, solution, section_length)
-    best_candidate, best_cost = best_section_insert_regret(remove_section, leftover_section, interior_nodes,exterior_nodes, orphans, runner, solution, depot_sorties)
+    best_candidate, best_cost = best_section_insert_regret(remove_section, leftover_section, interior_nodes,exterior_nodes, orphans, runner, solution, depot_sorties, bound)
 
 
     return best_candidate, best_cost
@@ -32,13 +33,6 @@ def delete_truck_section(runner, solution, section_length):
     candidate = copy_solution(solution)
 
 
-    if len(candidate["part1"]) in candidate["part4"]:
-        pos = candidate["part4"].index(len(candidate["part1"]))
-        sep = candidate["part4"].index(-1)
-        if pos < sep:
-            d = 0
-        else:
-            d = 1
     shifted_truck = candidate["part1"][0:-1]
 
     shift = random.randint(0,len(shifted_truck)-1)
@@ -48,6 +42,8 @@ def delete_truck_section(runner, solution, section_length):
     remove_section = shifted_truck[:section_length]
 
     leftover_section = shifted_truck[section_length:]
+    # Membership is tested for every sortie below
+    removed = set(remove_section)
 
     
     interior_nodes = []
@@ -67,9 +63,9 @@ def delete_truck_section(runner, solution, section_length):
             depot_sorties.append((node, sender_node, receiver_node, drone_index))
             continue
 
-        if (sender_node in remove_section) and (receiver_node in remove_section):
+        if (sender_node in removed) and (receiver_node in removed):
             interior_nodes.append((node, sender_node, receiver_node, drone_index))
-        elif (sender_node in remove_section) or (receiver_node in remove_section):
+        elif (sender_node in removed) or (receiver_node in removed):
             orphans.append(node)
         else:
             exterior_nodes.append((node, sender_node, receiver_node, drone_index))
@@ -77,79 +73,56 @@ def delete_truck_section(runner, solution, section_length):
     return(remove_section, leftover_section, interior_nodes, exterior_nodes, orphans, depot_sorties)
 
 
-def best_section_insert_regret(remove_section, leftover_section, interior_nodes, exterior_nodes, orphans, runner, solution, depot_sorties):
+def best_section_insert_regret(remove_section, leftover_section, interior_nodes, exterior_nodes, orphans, runner, solution, depot_sorties, bound=None):
+    # Without orphans the section candidate is the final candidate, so the caller's bound applies to it directly
+    section_bound = bound if (bound is not None and len(orphans) == 0) else float('inf')
     best_cost = float('inf')
     best_candidate = None
-
-    #For insertion positions
-    for i in range(len(leftover_section)+1):
-        #For orientation
-        for o in range(2):
-            truck_candidate = leftover_section.copy()
-            insert = remove_section.copy()
-            if o == 1:
-                insert.reverse()
-            truck_candidate = leftover_section[:i] + insert + leftover_section[i:]
-
-            # We shift back so 0 is at the start again, and add the 0 at the end back
-            shift = truck_candidate.index(0)
-            truck_candidate = truck_candidate[shift:] + truck_candidate[:shift]
-            truck_candidate.append(0)
-
-            p2d1, p3d1, p4d1 = [], [], []
-            p2d2, p3d2, p4d2 = [], [], []
-
-            exterior_nodes.sort(key=lambda x: truck_candidate.index(x[1]))
-            if o == 0:
-                interior_nodes.sort(key=lambda x: truck_candidate.index(x[1]))
-            else:
-                interior_nodes.sort(key=lambda x: truck_candidate.index(x[2]))
-
-            all_nodes = sorted(
-                exterior_nodes + 
-                [(n, r, s, d) if o == 1 else (n, s, r, d) for n, s, r, d in interior_nodes] +
-                [(n, s, 0, d) for n, s, r, d in depot_sorties if n not in orphans],
-                key=lambda x: truck_candidate.index(x[1])
-            )
-
-            for n, s, r, d in all_nodes:
-                s_index = truck_candidate.index(s)
-                r_index = truck_candidate.index(r) if r != 0 else len(truck_candidate) - 1
-                if d == 0:
-                    p2d1.append(n)
-                    p3d1.append(s_index + 1)
-                    p4d1.append(r_index + 1)
-                else:
-                    p2d2.append(n)
-                    p3d2.append(s_index + 1)
-                    p4d2.append(r_index + 1)
-
-            candidate = {
-                "part1" : truck_candidate,
-                "part2" : p2d1 + [-1] + p2d2,
-                "part3" : p3d1 + [-1] + p3d2,
-                "part4" : p4d1 + [-1] + p4d2,
-            }
-
-            # Very costly if we check orphans for all insert positions. Instead we select ideal insert position first, then add orphans later.
-            obj, arr, dep, feas = runner.calculate_total_waiting_time(candidate)
-            # We could improve performance here by only checking boundaries instead of the whole length.. but this is easier
-
+    section_candidates = []
+
+    if not runner.batch_evaluation and 0 not in remove_section:
+        # Score the insert positions incrementally, and build only the winning candidate
+        i, o, best_cost = section_insert_scan(runner, remove_section, leftover_section, interior_nodes, exterior_nodes, depot_sorties, section_bound)
+        if i is not None:
+            best_candidate = section_candidate(remove_section, leftover_section, interior_nodes, exterior_nodes, orphans, depot_sorties, i, o)
+    else:
+        #For insertion positions
+        for i in range(len(leftover_section)+1):
+            #For orientation
+            for o in range(2):
+                candidate = section_candidate(remove_section, leftover_section, interior_nodes, exterior_nodes, orphans, depot_sorties, i, o)
+
+                # Very costly if we check orphans for all insert positions. Instead we select ideal insert position first, then add orphans later.
+                if runner.batch_evaluation:
+                    section_candidates.append(candidate)
+                    continue
+                # Only a candidate that beats the best so far matters, so the evaluation stops once it passes that
+                obj, arr, dep, feas = runner.calculate_total_waiting_time(candidate, min(section_bound, best_cost))
+
+                # candidate is rebuilt from scratch every iteration, so it can be kept without a copy
+                if (obj < best_cost) and feas:
+                    best_candidate = candidate
+                    best_cost = obj
+
+    # In batch mode all insert positions and orientations are evaluated in one vectorized call
+    if section_candidates:
+        totals, feasible = runner.calculate_total_waiting_time_batch(section_candidates, section_bound)
+        for candidate, obj, feas in zip(section_candidates, totals, feasible):
             if (obj < best_cost) and feas:
-                best_candidate = copy_solution(candidate)
-                best_cost = obj.copy()
+                best_candidate = candidate
+                best_cost = float(obj)
 
     if best_candidate:
         if len(orphans)>0:
             best_candidate = regret_insert(runner, best_candidate, orphans)
             
-        objective, _, _, feas = runner.calculate_total_waiting_time(best_candidate)
+        objective, feas = runner.evaluate_cached(best_candidate, bound)
         if feas:
             return best_candidate, objective
         
     
     #Fallback to input in case 
-    total,_,_,_ = runner.calculate_total_waiting_time(solution)
+    total, _ = runner.evaluate_cached(solution)
     return solution, total
 
 
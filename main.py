@@ -12,11 +12,21 @@ from SimAnnMultipleOps import sim_ann_multiple_ops
 from AdaptiveSa import adaptive_sa
 from pyinstrument import Profiler
 from CreateInitSolution import create_initial_solution 
+from Split import create_split_solution
+from MultiSeed import run_multi_seed
+from ParallelTempering import parallel_tempering
+from BatchSa import batch_sa
 
 from concurrent.futures import ProcessPoolExecutor
 
 
 filename = "Data/F_20.txt"
+# Seconds per instance (per seed/chain run) for the search drivers; None runs their iteration counts instead
+time_limit = None
+
+def iterations(count):
+    #Iteration count for a driver. With a time_limit the deadline ends (and cools) the run, so there is no cap.
+    return count if time_limit is None else None
 # ---------------------------------------------------------------------------
 def run_for_file(filename):
     ### ---START--- ###
@@ -44,7 +54,8 @@ def run_for_file(filename):
 
     initial_result = runner.run()
 
-    new_solution = create_initial_solution(runner)
+    # Farthest insertion tour, 2-opt/Or-opt pass, then the optimal drone split of that tour
+    new_solution = create_split_solution(runner)
     print(new_solution)
     total, _, _, _ = runner.calculate_total_waiting_time(new_solution)
 
@@ -62,10 +73,11 @@ def run_for_file(filename):
     # --
 
     start = time.time() 
-    #new_solution = local_search(runner, 10000)
-    #new_solution = sim_ann(runner, 10000)
-    #new_solution = sim_ann_multiple_ops(runner, 10000)
-    new_solution = adaptive_sa(runner, 10000, filename)
+    #new_solution = local_search(runner, iterations(10000), time_limit=time_limit)
+    #new_solution = sim_ann(runner, iterations(10000), time_limit=time_limit)
+    #new_solution = sim_ann_multiple_ops(runner, iterations(10000), time_limit=time_limit)
+    new_solution = adaptive_sa(runner, iterations(10000), filename, time_limit=time_limit)
+    #new_solution = batch_sa(runner, iterations(2000), filename, batch_size=8, time_limit=time_limit)
 
 
     # -- Results --
@@ -83,6 +95,9 @@ def run_for_file(filename):
     print()
     print(end - start)
     print()
+    # Hit/miss/eviction counts, for sizing memo_size per instance
+    print("Evaluation memo:", runner.memo_stats())
+    print()
     new_runner = create_new_runner(filename, new_solution)
     new_result = new_runner.run(debug=True)
     print("new solution:")
@@ -110,5 +125,16 @@ if __name__ == "__main__":
     "Data/R_100.txt",
     "Data/F_100.txt",
     ]
-    with ProcessPoolExecutor(max_workers=10) as executor:
-        results = list(executor.map(run_for_file, filenames))
\ No newline at end of file
+    # Independent adaptive_sa seeds per instance; 1 runs the single-seed run_for_file per instance instead
+    n_seeds = 4
+    # Replica exchange instead: one instance at a time, with every worker running a chain of it
+    tempering = False
+    # The compiled evaluation kernel (if Numba is installed) is built or loaded from its disk cache on import,
+    # so the workers start with it ready instead of each compiling it.
+    if tempering:
+        results = [parallel_tempering(filename, iterations(2000), n_chains=10, time_limit=time_limit) for filename in filenames]
+    elif n_seeds > 1:
+        results = run_multi_seed(filenames, n_seeds, iterations(10000), max_workers=10, time_limit=time_limit)
+    else:
+        with ProcessPoolExecutor(max_workers=10) as executor:
+            results = list(executor.map(run_for_file, filenames))
\ No newline at end of file